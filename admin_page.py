@@ -1,14 +1,17 @@
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.message import EmailMessage
 import os
 import pandas as pd
 from dotenv import load_dotenv
 import streamlit as st
 import hashlib
 import json
-from datetime import datetime, date
+import datetime
+import analytics
+import export
+import outbox
+import repository
+import rollups
 
 # Set page configuration as the first command
 st.set_page_config(page_title="Placement Cell", page_icon=":guardsman:", layout="wide")
@@ -19,21 +22,21 @@ load_dotenv()
 EMAIL_USER = os.getenv("EMAIL_USER")
 EMAIL_PASS = os.getenv("EMAIL_PASS")
 
+# Deliver whatever was left queued or retrying before a restart
+outbox.start_worker()
+
 # Admin credentials
 ADMIN_CREDENTIALS = {
     "admin": hashlib.sha256("admin123".encode()).hexdigest()
 }
 
-# Send email about shortlisting or selection
-def send_shortlist_email(to_email, student_name, company_name, role, job_id, round_name, status):
-    try:
-        msg = EmailMessage()
-        msg["Subject"] = f"You have been {status.upper()} - {company_name} ({round_name})"
-        msg["From"] = EMAIL_USER
-        msg["To"] = to_email
-
-        status_line = "shortlisted" if status == "shortlisted" else "SELECTED"
-        msg.set_content(f"""
+# Email about shortlisting or selection, as an outbox message
+def shortlist_message(to_email, student_name, company_name, role, job_id, round_name, status):
+    status_line = "shortlisted" if status == "shortlisted" else "SELECTED"
+    return {
+        "to": to_email,
+        "subject": f"You have been {status.upper()} - {company_name} ({round_name})",
+        "body": f"""
 Hello {student_name},
 
 🎉 Congratulations! You have been {status_line.upper()} for the following opportunity:
@@ -48,46 +51,53 @@ Please stay updated for the next steps.
 
 Best regards,  
 Placement Cell
-""")
+""",
+    }
 
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(EMAIL_USER, EMAIL_PASS)
-        server.send_message(msg)
-        server.quit()
-        return True
-    except Exception as e:
-        print("Error sending email:", e)
-        return False
+# Email copy of a Send Notification entry
+def notification_message(to_email, student_name, notification):
+    link = f"\nMeeting Link: {notification['meeting_link']}" if notification.get("meeting_link") else ""
+    return {
+        "to": to_email,
+        "subject": f"📢 {notification['company_name']} - {notification['round']} update",
+        "body": f"""
+Hello {student_name},
 
-def load_students():
-    if os.path.exists("students.json"):
-        with open("students.json", "r") as file:
-            return json.load(file)
-    return []
+There is an update for {notification['company_name']} ({notification['role']}, Job ID: {notification['job_id']}):
 
-def save_students(data):
-    with open("students.json", "w") as file:
-        json.dump(data, file, indent=4)
+Round: {notification['round']}
+Venue: {notification['venue']}
+Time: {notification['time']}{link}
 
-def load_companies():
-    try:
-        with open("companies.json", "r") as file:
-            companies = json.load(file)
-            for company in companies:
-                if 'date_of_drive' in company and company['date_of_drive']:
-                    company['date_of_drive'] = date.fromisoformat(company['date_of_drive'])
-            return companies
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+{notification['description']}
 
-def save_companies(companies):
-    for company in companies:
-        if isinstance(company['date_of_drive'], date):
-            company['date_of_drive'] = company['date_of_drive'].strftime('%Y-%m-%d')
+Best regards,  
+Placement Cell
+""",
+    }
 
-    with open("companies.json", "w") as file:
-        json.dump(companies, file, indent=4)
+def send_shortlist_email(to_email, student_name, company_name, role, job_id, round_name, status):
+    # Queued for the outbox worker; the shortlist is already saved, so a failure only warns
+    try:
+        outbox.enqueue(**shortlist_message(to_email, student_name, company_name, role, job_id, round_name, status))
+        return True
+    except OSError as e:
+        st.warning(f"Email not queued: {e}")
+        return False
+
+def read_student_ids(uploaded_file):
+    # Student IDs from an uploaded CSV/XLSX: the student_id/id column, else the
+    # first column of a file without a header row
+    read = pd.read_excel if uploaded_file.name.lower().endswith(".xlsx") else pd.read_csv
+    df = read(uploaded_file, dtype=str)
+    columns = {str(c).strip().lower().replace(" ", "_"): c for c in df.columns}
+    column = next((columns[c] for c in ("student_id", "id", "roll_no", "roll_number") if c in columns), None)
+    if column is None:
+        uploaded_file.seek(0)
+        df = read(uploaded_file, dtype=str, header=None)
+        column = df.columns[0]
+    ids = [str(v).strip() for v in df[column].dropna()]
+    return list(dict.fromkeys(i for i in ids if i))
 
 def admin_login():
     if st.session_state.get("admin_logged_in"):
@@ -105,45 +115,100 @@ def admin_login():
         else:
             st.error("❌ Invalid username or password")
 
+# --------- Paged lists ---------
+PAGE_SIZES = [10, 25, 50, 100]
+
+def _sort_value(value):
+    # Numbers before text, None last
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value, "")
+    if value is None:
+        return (2, 0, "")
+    return (1, 0, str(value).lower())
+
+def list_controls(records, columns, key):
+    # Sort, page size, page and view mode; returns (rows on this page, table mode?)
+    c1, c2, c3, c4 = st.columns([2, 1, 1, 1])
+    sort_by = c1.selectbox("Sort by", list(columns), key=f"{key}_sort")
+    descending = c2.checkbox("Descending", key=f"{key}_desc")
+    page_size = c3.selectbox("Per page", PAGE_SIZES, index=1, key=f"{key}_size")
+    pages = max(1, -(-len(records) // page_size))
+    # keyed by the page count so a shorter list (e.g. after a search) starts again at page 1
+    page = c4.number_input("Page", min_value=1, max_value=pages, value=1, key=f"{key}_page_{pages}")
+    table_mode = st.checkbox("Table view", value=True, key=f"{key}_table")
+
+    field = columns[sort_by]
+    if field is None:
+        # keep the order records came in (e.g. search relevance)
+        ordered = list(reversed(records)) if descending else records
+    else:
+        ordered = sorted(records, key=lambda r: _sort_value(r.get(field)), reverse=descending)
+    start = (page - 1) * page_size
+    st.caption(f"Showing {start + 1}–{min(start + page_size, len(records))} of {len(records)}")
+    return ordered[start:start + page_size], table_mode
+
+def show_resume(student, key):
+    # The file is only read once asked for
+    resume_path = student.get("resume")
+    if not resume_path or not os.path.exists(resume_path):
+        return
+    if st.session_state.get(key) or st.button("📄 Load Resume", key=f"{key}_load"):
+        st.session_state[key] = True
+        with open(resume_path, "rb") as f:
+            st.download_button("📄 Download Resume", data=f.read(), file_name=os.path.basename(resume_path),
+                               mime="application/pdf", key=f"{key}_download")
+
 def generate_job_id(company_name, role):
     return f"{company_name.lower().replace(' ', '_')}_{role.lower().replace(' ', '_')}"
 
 def admin_dashboard():
     st.title("📊 Admin Dashboard")
 
-    students = load_students()
-    companies = load_companies()
+    companies = repository.load_companies()
 
-    for company in companies:
-        if 'job_id' not in company:
-            company['job_id'] = generate_job_id(company['name'], company['role'])
-    save_companies(companies)
-    menu = ["View Students", "Add a New Company", "Placement Analytics", "View All Companies", "Shortlisted Students", "Send Notification","Student Queries"]
+    missing_job_ids = [c for c in companies if 'job_id' not in c]
+    for company in missing_job_ids:
+        company['job_id'] = generate_job_id(company['name'], company['role'])
+    if missing_job_ids:
+        repository.save_companies(companies)
+    menu = ["View Students", "Add a New Company", "Placement Analytics", "View All Companies", "Shortlisted Students", "Send Notification","Student Queries", "Email Outbox"]
 
     # menu = ["View Students", "Add a New Company", "Placement Analytics", "View All Companies", "Shortlisted Students"]
     choice = st.radio("Choose Action", menu, horizontal=True)
 
     if choice == "View Students":
         st.subheader("📋 Registered Students")
-        search_query = st.text_input("Search by Name or Student ID")
-        filtered_students = [
-            s for s in students
-            if search_query.lower() in s['name'].lower()
-            or search_query.lower() in s.get('student_id', '').lower()
-            or search_query.lower() in s.get('id', '').lower()
-        ]
+        search_query = st.text_input("Search by Name, Student ID, Email or Branch")
+        # Ranked matches on name, ID, email and branch from the search index
+        filtered_students = repository.search_students(search_query)
 
         if filtered_students:
-            for s in filtered_students:
+            page, table_mode = list_controls(
+                filtered_students,
+                {"Relevance": None, "Name": "name", "Student ID": "student_id", "Branch": "branch", "CGPA": "cgpa"},
+                "students")
+
+            def show_student(s):
                 student_id = s.get('student_id') or s.get('id')
-                with st.expander(f"{s['name']} ({student_id})"):
-                    st.write(f"**Branch:** {s['branch']}")
-                    st.write(f"**CGPA:** {s['cgpa']}")
-                    st.write(f"**Email:** {s['email']}")
-                    resume_path = s.get("resume")
-                    if resume_path and os.path.exists(resume_path):
-                        with open(resume_path, "rb") as f:
-                            st.download_button("📄 Download Resume", data=f, file_name=os.path.basename(resume_path), mime="application/pdf")
+                st.write(f"**Branch:** {s['branch']}")
+                st.write(f"**CGPA:** {s['cgpa']}")
+                st.write(f"**Email:** {s['email']}")
+                show_resume(s, f"resume_{student_id}")
+
+            if table_mode:
+                st.dataframe(pd.DataFrame([
+                    {"Name": s["name"], "Student ID": s.get('student_id') or s.get('id'), "Branch": s.get("branch"),
+                     "CGPA": s.get("cgpa"), "Email": s.get("email")} for s in page
+                ]), hide_index=True, use_container_width=True)
+                labels = {f"{s['name']} ({s.get('student_id') or s.get('id')})": s for s in page}
+                opened = st.selectbox("Open student", ["—"] + list(labels), key="students_open")
+                if opened in labels:
+                    show_student(labels[opened])
+            else:
+                for s in page:
+                    student_id = s.get('student_id') or s.get('id')
+                    with st.expander(f"{s['name']} ({student_id})"):
+                        show_student(s)
         else:
             st.info("No students found with that search.")
 
@@ -171,7 +236,7 @@ def admin_dashboard():
                     "job_id": job_id
                 }
                 companies.append(new_company)
-                save_companies(companies)
+                repository.save_companies(companies)
                 st.success(f"Company '{company_name}' added successfully!")
             else:
                 st.error("Please fill all required fields correctly.")
@@ -182,39 +247,68 @@ def admin_dashboard():
         if not companies:
             st.info("No companies available.")
         else:
-            for i, company in enumerate(companies):
-                with st.expander(f"{company['name']} - {company['role']}"):
-                    st.write(f"**Package:** {company['package']} LPA")
-                    st.write(f"**Min CGPA:** {company['min_cgpa']}")
-                    st.write(f"**Departments:** {', '.join(company['eligible_departments'])}")
-                    st.write(f"**Drive Date:** {company['date_of_drive']}")
-                    st.write(f"**Job ID:** `{company['job_id']}`")
-                    st.write(f"**Drive Completed:** {'✅ Yes' if company.get('completed') else '❌ No'}")
-
-                    if st.button("✅ Mark Drive as Completed", key=f"completed_{i}"):
-                        companies[i]['completed'] = True
-                        save_companies(companies)
-                        st.success(f"Drive marked as completed for {company['name']}.")
-
-                    if st.button("🗑️ Delete Company", key=f"delete_{i}"):
-                        del companies[i]
-                        save_companies(companies)
-                        st.warning(f"Company '{company['name']}' deleted.")
-                        st.experimental_rerun()
+            page, table_mode = list_controls(
+                companies,
+                {"Drive Date": "date_of_drive", "Name": "name", "Role": "role", "Package": "package",
+                 "Min CGPA": "min_cgpa"},
+                "companies")
+
+            def show_company(company):
+                job_id = company['job_id']
+                st.write(f"**Package:** {company['package']} LPA")
+                st.write(f"**Min CGPA:** {company['min_cgpa']}")
+                st.write(f"**Departments:** {', '.join(company['eligible_departments'])}")
+                st.write(f"**Drive Date:** {company['date_of_drive']}")
+                st.write(f"**Job ID:** `{job_id}`")
+                st.write(f"**Drive Completed:** {'✅ Yes' if company.get('completed') else '❌ No'}")
+
+                if st.button("✅ Mark Drive as Completed", key=f"completed_{job_id}"):
+                    company['completed'] = True
+                    repository.save_companies(companies)
+                    st.success(f"Drive marked as completed for {company['name']}.")
+
+                if st.button("🗑️ Delete Company", key=f"delete_{job_id}"):
+                    companies.remove(company)
+                    repository.save_companies(companies)
+                    st.warning(f"Company '{company['name']}' deleted.")
+                    st.experimental_rerun()
+
+            if table_mode:
+                st.dataframe(pd.DataFrame([
+                    {"Name": c["name"], "Role": c["role"], "Package": c.get("package"), "Min CGPA": c.get("min_cgpa"),
+                     "Drive Date": str(c.get("date_of_drive")), "Job ID": c.get("job_id"),
+                     "Completed": bool(c.get("completed"))} for c in page
+                ]), hide_index=True, use_container_width=True)
+                labels = {f"{c['name']} - {c['role']} ({c['job_id']})": c for c in page}
+                opened = st.selectbox("Open company", ["—"] + list(labels), key="companies_open")
+                if opened in labels:
+                    show_company(labels[opened])
+            else:
+                for company in page:
+                    with st.expander(f"{company['name']} - {company['role']}"):
+                        show_company(company)
 
     elif choice == "Placement Analytics":
         st.subheader("📈 Placement Analytics")
         # Summary boxes
         st.markdown("### 📊 Summary")
 
+        # Cached until the data changes; the button also picks up edits made outside the app
+        if st.button("🔄 Recompute now"):
+            analytics.clear_cache()
+            repository.rebuild_counters()
+
         colA, colB = st.columns(2)
 
+        stats = analytics.cached_section(
+            "placement_stats", repository.counters_version(),
+            lambda: analytics.placement_stats(repository.placement_counters(), companies))
+
         with colA:
             st.success(f"🏢 **Total Companies:** {len(companies)}")
 
         with colB:
-            placed_students = [s for s in students if s.get("selected_company")]
-            st.info(f"🎓 **Students Placed:** {len(placed_students)}")
+            st.info(f"🎓 **Students Placed:** {stats['placed']}")
 
 
         col1, col2 = st.columns(2)
@@ -222,47 +316,17 @@ def admin_dashboard():
         # 1. Students Placed per Company
         with col1:
             st.markdown("**🏢 Students Placed per Company**")
-            placed_company_counts = {}
-            for student in students:
-                if student.get("selected_company"):
-                    company = student["selected_company"]
-                    placed_company_counts[company] = placed_company_counts.get(company, 0) + 1
-
-            if placed_company_counts:
-                df_company = pd.DataFrame(list(placed_company_counts.items()), columns=["Company", "Count"])
+            df_company = stats["per_company"]
+            if not df_company.empty:
                 st.bar_chart(df_company.set_index("Company"))
             else:
                 st.info("No placement data available.")
 
         # 2. Students Placed per Year
-        import datetime  # Ensure the datetime module is imported properly
-
-# 2. Students Placed per Year
         with col2:
             st.markdown("**📅 Students Placed per Year**")
-            company_year_map = {}
-            for company in companies:
-                try:
-                    year = datetime.datetime.strptime(company["date_of_drive"], "%Y-%m-%d").year
-                    company_year_map[company["job_id"]] = year
-                except:
-                    continue
-
-            year_selection_count = {}
-            for student in students:
-                if "selected" in student and isinstance(student["selected"], list):
-                    for job_id in student["selected"]:
-                        year = company_year_map.get(job_id)
-                        if year:
-                            year_selection_count[year] = year_selection_count.get(year, 0) + 1
-                elif "selected_company" in student:
-                    for comp in companies:
-                        if comp["name"].lower() == student["selected_company"].lower():
-                            year = datetime.datetime.strptime(comp["date_of_drive"], "%Y-%m-%d").year
-                            year_selection_count[year] = year_selection_count.get(year, 0) + 1
-
-            if year_selection_count:
-                df_year = pd.DataFrame(list(year_selection_count.items()), columns=["Year", "Count"])
+            df_year = stats["per_year"]
+            if not df_year.empty:
                 st.bar_chart(df_year.set_index("Year"))
             else:
                 st.info("No year-wise data available.")
@@ -271,14 +335,8 @@ def admin_dashboard():
         # 3. Students Placed per Branch
         with col3:
             st.markdown("**🎓 Students Placed per Branch**")
-            branch_count = {}
-            for student in students:
-                if student.get("selected_company"):
-                    branch = student.get("branch", "Unknown")
-                    branch_count[branch] = branch_count.get(branch, 0) + 1
-
-            if branch_count:
-                df_branch = pd.DataFrame(list(branch_count.items()), columns=["Branch", "Count"])
+            df_branch = stats["per_branch"]
+            if not df_branch.empty:
                 st.bar_chart(df_branch.set_index("Branch"))
             else:
                 st.info("No branch placement data available.")
@@ -286,18 +344,7 @@ def admin_dashboard():
         # 4. Applications per Company
             st.markdown("### 🗂️ Company-wise Applications & Placements")
 
-            company_stats = []
-
-            for company in companies:
-                comp_name = company["name"]
-                
-                # Count how many students applied to this company
-                applied_count = sum(1 for student in students if comp_name in student.get("applications", []))
-
-                # Count how many students are placed in this company
-                placed_count = sum(1 for student in students if student.get("selected_company") == comp_name)
-
-                company_stats.append((comp_name, applied_count, placed_count))
+            company_stats = stats["company_stats"]
 
             # Display as info boxes
             for i in range(0, len(company_stats), 2):
@@ -311,6 +358,31 @@ def admin_dashboard():
                             f"- 🎯 Placed: `{placed}`"
                         )
 
+        # Multi-year trends from the roll-up store, not from the raw records
+        st.markdown("### 📆 Placement Trends")
+        if st.button("📸 Snapshot roll-ups from current data"):
+            rollups.snapshot()
+            st.success("Roll-ups updated.")
+        rollup_data = rollups.load()
+        if rollup_data["years"]:
+            trends, branch_trends, drive_rollups = analytics.trend_frames(rollup_data)
+            st.line_chart(trends[["Placed"]])
+            st.bar_chart(trends[["Median Package", "Max Package"]])
+            st.markdown("**🎓 Placed Students per Branch by Academic Year**")
+            st.bar_chart(branch_trends)
+            with st.expander("Per-drive roll-ups"):
+                st.dataframe(drive_rollups)
+        else:
+            st.info("No roll-ups yet. Take a snapshot to start the history.")
+
+        st.markdown("### 📦 Export Data")
+        export_format = st.selectbox("Format", export.available_formats())
+        if st.button("Export students, applications, shortlists, selections and companies"):
+            zip_path = export.export_zip(export.default_dir(), (export_format,))
+            with open(zip_path, "rb") as f:
+                st.download_button("⬇️ Download export", data=f, file_name=os.path.basename(zip_path),
+                                   mime="application/zip")
+
             
 
 
@@ -327,18 +399,20 @@ def admin_dashboard():
         if not companies:
             st.info("No companies available.")
         else:
+            rounds = ["Round 1", "Round 2", "Round 3", "HR Round", "Final Round"]
+            shortlist_counts = repository.placement_counters()["shortlists"]
             for company in companies:
                 company_title = f"{company['name']} - {company['role']}"
                 job_id = company['job_id']
+                # Per-round counts come from the counters, students from the shortlist index
+                counts = shortlist_counts.get(job_id, {})
+                # (in a caption: changing the expander label would close it after every shortlist)
+                summary = " | ".join(f"{r}: {counts[r]}" for r in rounds if counts.get(r))
+                st.caption(f"{company_title} shortlisted: {summary or 'none yet'}")
                 with st.expander(company_title):
-                    rounds = ["Round 1", "Round 2", "Round 3", "HR Round", "Final Round"]
                     selected_round = st.selectbox(f"Select Round for {company_title}", rounds, key=job_id)
 
-                    shortlisted_students = []
-                    for student in students:
-                        shortlists = student.get("shortlists", {})
-                        if job_id in shortlists and shortlists[job_id].get(selected_round):
-                            shortlisted_students.append(student)
+                    shortlisted_students = repository.shortlisted(job_id, selected_round)
 
                     if shortlisted_students:
                         st.write(f"### 👥 Students shortlisted for {selected_round}")
@@ -354,61 +428,66 @@ def admin_dashboard():
                     col1, col2 = st.columns(2)
                     with col1:
                         if st.button("Shortlist Student", key=f"shortlist_{job_id}_{selected_round}"):
-                            found = False
-                            for s in students:
-                                sid = s.get("student_id") or s.get("id")
-                                if sid == student_id_input:
-                                    if "shortlists" not in s:
-                                        s["shortlists"] = {}
-                                    if job_id not in s["shortlists"]:
-                                        s["shortlists"][job_id] = {}
-                                    s["shortlists"][job_id][selected_round] = True
-                                    save_students(students)
-                                    st.success(f"{s['name']} shortlisted for {selected_round} of {company_title}.")
-                                    send_shortlist_email(
-                                        to_email=s["email"],
-                                        student_name=s["name"],
-                                        company_name=company["name"],
-                                        role=company["role"],
-                                        job_id=job_id,
-                                        round_name=selected_round,
-                                        status="shortlisted"
-                                    )
-                                    found = True
-                                    break
-                            if not found:
+                            s = repository.set_shortlist(student_id_input, job_id, selected_round)
+                            if s:
+                                st.success(f"{s['name']} shortlisted for {selected_round} of {company_title}.")
+                                send_shortlist_email(
+                                    to_email=s["email"],
+                                    student_name=s["name"],
+                                    company_name=company["name"],
+                                    role=company["role"],
+                                    job_id=job_id,
+                                    round_name=selected_round,
+                                    status="shortlisted"
+                                )
+                            else:
                                 st.error("Student ID not found.")
 
                     with col2:
                         if st.button("Mark as Selected", key=f"select_{job_id}_{selected_round}"):
-                            found = False
-                            for s in students:
-                                sid = s.get("student_id") or s.get("id")
-                                if sid == student_id_input:
-                                    if "selected" not in s:
-                                        s["selected"] = []
-                                    if job_id not in s["selected"]:
-                                        s["selected"].append(job_id)
-                                    if "shortlists" not in s:
-                                        s["shortlists"] = {}
-                                    if job_id not in s["shortlists"]:
-                                        s["shortlists"][job_id] = {}
-                                    s["shortlists"][job_id][selected_round] = True
-                                    save_students(students)
-                                    st.success(f"{s['name']} marked as SELECTED for {company_title}.")
-                                    send_shortlist_email(
-                                        to_email=s["email"],
-                                        student_name=s["name"],
-                                        company_name=company["name"],
-                                        role=company["role"],
-                                        job_id=job_id,
-                                        round_name=selected_round,
-                                        status="selected"
-                                    )
-                                    found = True
-                                    break
-                            if not found:
+                            s = repository.mark_selected(student_id_input, job_id, selected_round)
+                            if s:
+                                st.success(f"{s['name']} marked as SELECTED for {company_title}.")
+                                send_shortlist_email(
+                                    to_email=s["email"],
+                                    student_name=s["name"],
+                                    company_name=company["name"],
+                                    role=company["role"],
+                                    job_id=job_id,
+                                    round_name=selected_round,
+                                    status="selected"
+                                )
+                            else:
                                 st.error("Student ID not found.")
+
+                    st.markdown("#### 📤 Bulk import for this round:")
+                    uploaded = st.file_uploader("CSV or XLSX of student IDs", type=["csv", "xlsx"],
+                                                key=f"bulk_{job_id}_{selected_round}")
+                    bulk_select = st.checkbox("Mark as selected", key=f"bulk_select_{job_id}_{selected_round}")
+                    if uploaded is not None and st.button("Apply upload", key=f"bulk_apply_{job_id}_{selected_round}"):
+                        try:
+                            student_ids = read_student_ids(uploaded)
+                        except ImportError:
+                            st.error("Reading .xlsx files needs the openpyxl package; upload a CSV instead.")
+                        except (ValueError, IndexError) as e:
+                            st.error(f"Could not read the file: {e}")
+                        else:
+                            matched, unmatched = repository.bulk_shortlist(student_ids, job_id, selected_round,
+                                                                           selected=bulk_select)
+                            status = "selected" if bulk_select else "shortlisted"
+                            st.success(f"✅ {len(matched)} matched and {status}.")
+                            try:
+                                outbox.enqueue_many([
+                                    shortlist_message(s["email"], s["name"], company["name"], company["role"],
+                                                      job_id, selected_round, status)
+                                    for s in matched if s.get("email")
+                                ])
+                                st.info("📧 Emails are queued.")
+                            except OSError as e:
+                                st.warning(f"Emails not queued: {e}")
+                            if unmatched:
+                                st.warning(f"{len(unmatched)} unmatched: {', '.join(unmatched[:50])}"
+                                           + (" ..." if len(unmatched) > 50 else ""))
     elif choice == "Send Notification":
         st.subheader("📢 Send Notification to Students")
 
@@ -421,6 +500,8 @@ def admin_dashboard():
         round_time = st.time_input("Time of the Round")
         description = st.text_area("Description")
         meeting_link = st.text_input("Meeting Link (optional)")
+        email_to = st.multiselect("Also email students who", ["Applied", "Are shortlisted"],
+                                  help="Sent in the background; progress is shown below")
 
         if st.button("📤 Send Notification"):
             new_notification = {
@@ -434,23 +515,66 @@ def admin_dashboard():
                 "meeting_link": meeting_link
             }
 
-            notifications = load_notifications()
-            notifications.append(new_notification)
-            save_notifications(notifications)
+            repository.add_notification(new_notification)
             st.success("Notification sent successfully!")
 
-
-NOTIFICATIONS_FILE = "notifications.json"
-
-def load_notifications():
-    if os.path.exists(NOTIFICATIONS_FILE):
-        with open(NOTIFICATIONS_FILE, "r") as f:
-            return json.load(f)
-    return []
-
-def save_notifications(notifications):
-    with open(NOTIFICATIONS_FILE, "w") as f:
-        json.dump(notifications, f, indent=4)
+            if email_to:
+                recipients = repository.notification_recipients(selected_company_data["job_id"],
+                                                                applied="Applied" in email_to,
+                                                                shortlisted="Are shortlisted" in email_to)
+                group = (f"{selected_company_data['name']} ({selected_company_data['job_id']}) {round_number} - "
+                         f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+                try:
+                    outbox.enqueue_many([notification_message(s["email"], s["name"], new_notification)
+                                         for s in recipients if s.get("email")], group=group)
+                    st.info(f"📧 Emailing {len(recipients)} students in the background.")
+                except OSError as e:
+                    st.warning(f"Emails not queued: {e}")
+
+        # Progress of the latest email fan-outs
+        fanouts = outbox.groups(5)
+        if fanouts:
+            st.markdown("#### 📧 Notification emails")
+            st.button("🔄 Refresh progress")
+            for group, counts in fanouts.items():
+                total = sum(counts.values()) - counts["replayed"]  # a replayed email is counted by its copy
+                done = counts["sent"] + counts["dead"]
+                st.caption(f"{group}: {counts['sent']} sent, {counts['retrying']} retrying, {counts['dead']} failed, "
+                           f"{counts['queued']} queued of {total}")
+                st.progress(done / total if total else 1.0)
+
+    elif choice == "Email Outbox":
+        st.subheader("📧 Email Outbox")
+        # Delivery happens in the background; this shows how far it got
+        if st.button("🔄 Refresh"):
+            outbox.start_worker()
+        counts = outbox.counts()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Pending", counts["queued"])
+        col2.metric("Retrying", counts["retrying"])
+        col3.metric("Sent", counts["sent"])
+        col4.metric("Dead", counts["dead"])
+        messages = outbox.recent(100)
+        if messages:
+            st.dataframe(pd.DataFrame([
+                {"To": m["to"], "Subject": m["subject"], "Status": m["status"], "Attempts": m["attempts"],
+                 "Queued": m["queued_at"], "Finished": m["done_at"], "Error": m["error"]} for m in messages
+            ]), hide_index=True, use_container_width=True)
+        else:
+            st.info("No emails yet.")
+
+        # Failed for good or out of retries; replaying requeues them with fresh attempts
+        st.markdown("#### ☠️ Dead letters")
+        dead = outbox.dead_letters(200)
+        if dead:
+            st.dataframe(pd.DataFrame([
+                {"To": d["to"], "Subject": d["subject"], "Attempts": d["attempts"], "Failed": d["dead_at"],
+                 "Error": d["error"]} for d in dead
+            ]), hide_index=True, use_container_width=True)
+            if st.button("🔁 Replay all dead letters"):
+                st.success(f"Requeued {outbox.replay_dead()} emails.")
+        else:
+            st.info("No dead letters.")
 
 
 def plt_pie_chart(df):
@@ -460,25 +584,9 @@ def plt_pie_chart(df):
     return fig
 
 
-QUERIES_FILE = "queries.json"
-
 import streamlit as st
 import os
 import json
-import datetime
-
-QUERIES_FILE = "queries.json"
-RESPONSES_FILE = "responses.json"
-
-def load_queries():
-    if not os.path.exists(QUERIES_FILE):
-        return []
-    with open(QUERIES_FILE, "r") as f:
-        return json.load(f)
-
-def save_queries(queries):
-    with open(QUERIES_FILE, "w") as f:
-        json.dump(queries, f, indent=4)
 
 def save_response(student_id, student_name, original_query, response):
     response_entry = {
@@ -489,29 +597,21 @@ def save_response(student_id, student_name, original_query, response):
         "response_date": str(datetime.date.today())
     }
 
-    # Load existing responses or initialize
-    if os.path.exists(RESPONSES_FILE):
-        with open(RESPONSES_FILE, "r") as f:
-            try:
-                responses = json.load(f)
-            except json.JSONDecodeError:
-                responses = []
-    else:
-        responses = []
+    repository.add_response(response_entry)
 
-    responses.append(response_entry)
-    with open(RESPONSES_FILE, "w") as f:
-        json.dump(responses, f, indent=4)
+QUERIES_PAGE_SIZE = 20
 
 def admin_queries_section():
     st.subheader("📬 Student Queries")
 
-    queries = load_queries()
+    # Newest first; the record id is stable, so widget keys survive new queries arriving
+    limit = st.session_state.get("queries_limit", QUERIES_PAGE_SIZE)
+    queries = repository.latest("queries", limit + 1)
 
     if not queries:
         st.info("No queries submitted by students.")
     else:
-        for idx, query in enumerate(queries):
+        for query_id, query in queries[:limit]:
             with st.expander(f"{query['student_name']} (ID: {query['student_id']})"):
                 st.write(f"**Query:** {query['message']}")
                 date = query.get("date")
@@ -521,10 +621,13 @@ def admin_queries_section():
                     st.write("**Date:** Not provided")
 
                 # Admin response input
-                response = st.text_area(f"Enter your response to {query['student_name']}:", key=f"response_{idx}")
-                if st.button("Send Response", key=f"send_{idx}"):
+                response = st.text_area(f"Enter your response to {query['student_name']}:", key=f"response_{query_id}")
+                if st.button("Send Response", key=f"send_{query_id}"):
                     if response.strip():
                         save_response(query['student_id'], query['student_name'], query['message'], response)
                         st.success("✅ Response sent and saved!")
                     else:
                         st.warning("Please enter a response before sending.")
+        if len(queries) > limit and st.button("Show older", key="queries_more"):
+            st.session_state.queries_limit = limit + QUERIES_PAGE_SIZE
+            st.experimental_rerun()
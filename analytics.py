@@ -0,0 +1,74 @@
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Placement Analytics frames, read off the materialized counters (see counters.py)
+# instead of scanning every student on each visit.
+
+# Results of each section, keyed by (section, repository.counters_version(), args).
+# Streamlit reruns the whole page on every widget change; unchanged data is
+# served from here. Least recently used entries go first.
+CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "32"))
+_results = OrderedDict()
+_results_lock = threading.Lock()
+
+
+def cached_section(name, version, compute, *args):
+    key = (name, version) + args
+    with _results_lock:
+        if key in _results:
+            _results.move_to_end(key)
+            return _results[key]
+    value = compute(*args)
+    with _results_lock:
+        _results[key] = value
+        while len(_results) > CACHE_SIZE:
+            _results.popitem(last=False)
+    return value
+
+
+def clear_cache():
+    with _results_lock:
+        _results.clear()
+
+
+def _count_frame(counts, column, key=None):
+    items = sorted(counts.items(), key=key) if key else list(counts.items())
+    return pd.DataFrame({column: [k for k, _ in items], "Count": [n for _, n in items]})
+
+
+def placement_stats(counters, companies):
+    applications = counters["applications_per_job"]
+    placed = counters["placed_per_company"]
+    return {
+        "placed": counters["placed"],
+        "per_company": _count_frame(placed, "Company"),
+        "per_year": _count_frame({int(year): n for year, n in counters["placed_per_year"].items()}, "Year",
+                                 key=lambda item: item[0]),
+        "per_branch": _count_frame(counters["placed_per_branch"], "Branch"),
+        # (name, applications, placed) for every company, in listing order
+        "company_stats": [(c["name"], applications.get(c.get("job_id") or c["name"], 0), placed.get(c["name"], 0))
+                          for c in companies],
+    }
+
+
+def trend_frames(rollups):
+    # (per-year trends, branch distribution per year, per-drive table) from rollups.load()
+    years = rollups["years"]
+    trends = pd.DataFrame({
+        "Academic Year": list(years),
+        "Placed": [y["placed"] for y in years.values()],
+        "Median Package": [y["median_package"] for y in years.values()],
+        "Max Package": [y["max_package"] for y in years.values()],
+    }).set_index("Academic Year")
+    branches = pd.DataFrame({year: y["branches"] for year, y in years.items()}).T.fillna(0)
+    drives = pd.DataFrame([
+        {"Academic Year": d["academic_year"], "Company": d["name"], "Role": d["role"], "Drive Date": d["date_of_drive"],
+         "Package": d["package"], "Placed": d["placed"]}
+        for d in rollups["drives"].values()
+    ])
+    if not drives.empty:
+        drives = drives.sort_values(["Academic Year", "Drive Date"])
+    return trends, branches, drives
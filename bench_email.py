@@ -0,0 +1,209 @@
+import argparse
+import os
+import random
+import smtplib
+import socketserver
+import tempfile
+import threading
+import time
+
+import mail_transport
+import outbox
+
+# Email delivery throughput against a local in-process SMTP server, no Gmail needed
+# Usage: python bench_email.py [--messages 500] [--handshake-ms 150] [--latency-ms 5]
+#                              [--fail-rate 0.0] [--drop-rate 0.0] [--pool-size 2]
+# Modes:
+#   serial   a fresh connect + login per message, like the senders before the outbox
+#   pooled   mail_transport.send per message, reusing pooled sessions
+#   batched  mail_transport.send_batch, BATCH_SIZE messages per call, pool-size callers at once
+#   outbox   outbox.enqueue_many and the background worker; latency is enqueue -> sent
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    # Just enough SMTP for smtplib: EHLO, AUTH PLAIN, MAIL, RCPT, DATA, NOOP, RSET, QUIT
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        rng = random.Random()
+        time.sleep(server.handshake)  # stands in for TCP + TLS setup
+
+        def reply(line):
+            self.wfile.write((line + "\r\n").encode())
+
+        reply("220 localhost bench SMTP")
+        in_data = False
+        for raw in self.rfile:
+            line = raw.decode(errors="replace").rstrip("\r\n")
+            if in_data:
+                if line == ".":
+                    in_data = False
+                    time.sleep(server.latency)
+                    with server.lock:
+                        server.accepted += 1
+                    reply("250 2.0.0 queued")
+                continue
+            command = line[:4].upper()
+            if command in ("EHLO", "HELO"):
+                reply("250-localhost")
+                reply("250 AUTH PLAIN")
+            elif command == "AUTH":
+                time.sleep(server.handshake / 2)
+                reply("235 2.7.0 accepted")
+            elif command == "MAIL":
+                if rng.random() < server.drop_rate:
+                    return  # connection lost mid-session
+                reply("250 2.1.0 ok")
+            elif command == "RCPT":
+                reply("451 4.3.0 try again later" if rng.random() < server.fail_rate else "250 2.1.5 ok")
+            elif command == "DATA":
+                in_data = True
+                reply("354 go ahead")
+            elif command == "QUIT":
+                reply("221 bye")
+                return
+            else:
+                reply("250 ok")
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, handshake, latency, fail_rate, drop_rate):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.handshake, self.latency = handshake, latency
+        self.fail_rate, self.drop_rate = fail_rate, drop_rate
+        self.lock = threading.Lock()
+        self.connections = self.accepted = 0
+
+    def reset_counts(self):
+        with self.lock:
+            self.connections = self.accepted = 0
+
+
+def make_messages(n):
+    return [{"to": f"s{i}@example.com", "subject": f"Bench {i}", "body": "Hello from the benchmark.\n"}
+            for i in range(n)]
+
+
+# --------- Modes ---------
+def run_serial(messages, host, port):
+    latencies, failed = [], 0
+    for message in messages:
+        start = time.perf_counter()
+        try:
+            with smtplib.SMTP(host, port, timeout=30) as smtp:
+                smtp.login(os.environ["EMAIL_USER"], os.environ["EMAIL_PASS"])
+                smtp.send_message(mail_transport.build_message(message))
+        except (smtplib.SMTPException, OSError):
+            failed += 1
+        latencies.append(time.perf_counter() - start)
+    return latencies, failed
+
+
+def run_pooled(messages, host, port):
+    latencies, failed = [], 0
+    for message in messages:
+        start = time.perf_counter()
+        failed += mail_transport.send(message) is not None
+        latencies.append(time.perf_counter() - start)
+    return latencies, failed
+
+
+def run_batched(messages, host, port):
+    # Each message's latency runs from its batch's start to the batch's end
+    batches = [messages[i:i + outbox.BATCH_SIZE] for i in range(0, len(messages), outbox.BATCH_SIZE)]
+    latencies, failed = [], []
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not batches:
+                    return
+                batch = batches.pop(0)
+            start = time.perf_counter()
+            results = mail_transport.send_batch(batch)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.extend([elapsed] * len(batch))
+                failed.extend(r for r in results if r is not None)
+
+    threads = [threading.Thread(target=worker) for _ in range(mail_transport.POOL_SIZE)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, len(failed)
+
+
+def run_outbox(messages, host, port):
+    enqueued = time.perf_counter()
+    ids = outbox.enqueue_many(messages, group="bench")
+    finished = {}
+    pending = set(ids)
+    while pending:
+        time.sleep(0.01)
+        state = {m["id"]: m for m in outbox.recent(len(ids))}
+        for i in list(pending):
+            if state[i]["status"] in outbox.FINISHED:
+                finished[i] = time.perf_counter() - enqueued
+                pending.discard(i)
+    failed = sum(1 for i in ids if state[i]["status"] != "sent")
+    return list(finished.values()), failed
+
+
+MODES = {"serial": run_serial, "pooled": run_pooled, "batched": run_batched, "outbox": run_outbox}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark email delivery against a local SMTP server")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--handshake-ms", type=float, default=150, help="Delay before the greeting, and half again on AUTH")
+    parser.add_argument("--latency-ms", type=float, default=5, help="Delay per accepted message")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of recipients refused with 451")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of MAIL commands that drop the connection")
+    parser.add_argument("--pool-size", type=int, default=mail_transport.POOL_SIZE)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+
+    server = SMTPServer(args.handshake_ms / 1000, args.latency_ms / 1000, args.fail_rate, args.drop_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    os.environ.setdefault("EMAIL_USER", "bench@example.com")
+    os.environ.setdefault("EMAIL_PASS", "bench")
+
+    # Point the transport and the outbox at the local server and a scratch outbox
+    mail_transport.HOST, mail_transport.PORT, mail_transport.USE_SSL = host, port, False
+    scratch = tempfile.mkdtemp(prefix="bench_email_")
+    outbox.OUTBOX_FILE = os.path.join(scratch, "outbox.jsonl")
+    outbox.DEAD_FILE = os.path.join(scratch, "outbox.dead.jsonl")
+    outbox.RATE_PER_MINUTE = 0
+    outbox.MAX_ATTEMPTS = 1  # failures are counted, not retried
+    outbox.POLL_SECONDS = 0.05
+
+    messages = make_messages(args.messages)
+    print(f"{args.messages} messages, handshake {args.handshake_ms:g} ms, latency {args.latency_ms:g} ms, "
+          f"fail {args.fail_rate:g}, drop {args.drop_rate:g}, pool {args.pool_size}")
+    print(f"{'mode':<8} {'msgs/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'conns':>6} {'failed':>7}")
+    for mode in args.modes:
+        mail_transport.reset(args.pool_size)
+        server.reset_counts()
+        start = time.perf_counter()
+        latencies, failed = MODES[mode](messages, host, port)
+        elapsed = time.perf_counter() - start
+        print(f"{mode:<8} {len(messages) / elapsed:>9.1f} {percentile(latencies, 50) * 1000:>9.1f} "
+              f"{percentile(latencies, 99) * 1000:>9.1f} {server.connections:>6} {failed:>7}")
+    mail_transport.close_all()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import random
+import time
+
+import data_utils
+
+# Parse/dump timings of the data file formats on synthetic student records
+# Usage: python bench_serializers.py [--sizes 1000 10000 100000] [--repeat 3]
+
+BRANCHES = ["CSE", "ECE", "EEE", "MECH", "CIVIL"]
+COMPANIES = [f"company_{i}" for i in range(50)]
+ROUNDS = ["Round 1", "Round 2", "Round 3", "HR Round", "Final Round"]
+
+
+def make_students(n, seed=0):
+    rng = random.Random(seed)
+    students = []
+    for i in range(n):
+        applied = rng.sample(COMPANIES, rng.randint(0, 6))
+        shortlists = {
+            f"{c}_sde": {r: True for r in ROUNDS[:rng.randint(1, 3)]}
+            for c in applied[:rng.randint(0, 2)]
+        }
+        students.append({
+            "name": f"Student {i}",
+            "student_id": f"S{i:06d}",
+            "email": f"s{i}@example.com",
+            "password": "%064x" % rng.getrandbits(256),
+            "cgpa": f"{rng.uniform(5, 10):.2f}",
+            "branch": rng.choice(BRANCHES),
+            "applications": applied,
+            "placed": False,
+            "profile_pic": None,
+            "resume": f"resumes/S{i:06d}_resume.pdf",
+            "shortlists": shortlists,
+        })
+    return students
+
+
+def best_of(repeat, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data file formats")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    formats = ["json", "json-compact", "pickle"]
+    if data_utils.msgpack is not None:
+        formats.append("msgpack")
+    else:
+        print("(msgpack not installed, skipping it)")
+
+    print(f"{'records':>8}  {'format':<13} {'size MB':>8} {'dump ms':>9} {'parse ms':>9}")
+    for n in args.sizes:
+        students = make_students(n)
+        for fmt in formats:
+            raw = data_utils.dumps(students, fmt)
+            dump_time = best_of(args.repeat, lambda: data_utils.dumps(students, fmt))
+            parse_time = best_of(args.repeat, lambda: data_utils.loads(raw))
+            assert data_utils.loads(raw) == students
+            print(f"{n:>8}  {fmt:<13} {len(raw) / 1e6:>8.2f} {dump_time * 1000:>9.1f} {parse_time * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
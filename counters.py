@@ -0,0 +1,220 @@
+import argparse
+import os
+import sys
+import threading
+from collections import Counter
+
+import pandas as pd
+
+import data_utils
+from records import name_key
+
+# Materialized placement counters, kept in COUNTERS_FILE next to the data:
+#   placed                  students with at least one placement
+#   placed_per_company      company name -> placements
+#   placed_per_branch       branch -> placed students
+#   placed_per_year         drive year -> placements
+#   applications_per_job    job_id (company name if it has none) -> applicants
+#   shortlists              job_id -> round -> shortlisted students
+# Every count is a sum of per-student contributions, so a write only applies
+# the difference between one student's contribution before and after it.
+# The SQLite backend keeps them in its counters table instead, as rows (see
+# to_rows), updated in the same transaction as the write.
+COUNTERS_FILE = os.getenv("PLACEMENT_COUNTERS_FILE", "counters.json")
+SECTIONS = ("placed_per_company", "placed_per_branch", "placed_per_year", "applications_per_job", "shortlists")
+
+_lock = threading.RLock()
+
+
+def empty():
+    counters = {section: {} for section in SECTIONS}
+    counters["placed"] = 0
+    return counters
+
+
+def placements(student, companies):
+    # (company name, drive year or None, company or None) for every company the
+    # student was selected by: the "selected" job_ids, or the older
+    # selected_company field for records that predate them.
+    # companies is repository.company_index().
+    result = []
+    for job_id in student.get("selected") or ():
+        company = companies["by_job_id"].get(job_id)
+        result.append((job_id if company is None else company["name"], companies["year_by_job_id"].get(job_id),
+                       company))
+    if not result and student.get("selected_company"):
+        key = name_key(student["selected_company"])
+        company = companies["by_name_key"].get(key)
+        result.append((student["selected_company"] if company is None else company["name"],
+                       companies["year_by_name_key"].get(key), company))
+    return result
+
+
+def _application_key(company_name, companies):
+    # Applications only record the company name; counted under its job_id when known
+    company = companies["by_name"].get(company_name)
+    if company is None:
+        company = companies["by_name_key"].get(name_key(company_name))
+    job_id = company.get("job_id") if company is not None else None
+    return job_id or company_name
+
+
+def _keys(student, companies):
+    # The (section, key[, round]) entries one student adds 1 to
+    placed = placements(student, companies)
+    for company_name, year, _ in placed:
+        yield ("placed_per_company", company_name)
+        if year is not None:
+            yield ("placed_per_year", str(year))
+    if placed:
+        yield ("placed",)
+        yield ("placed_per_branch", student.get("branch") or "Unknown")
+    for company_name in set(student.get("applications") or ()):
+        yield ("applications_per_job", _application_key(company_name, companies))
+    for job_id, rounds in (student.get("shortlists") or {}).items():
+        for round_name, shortlisted in rounds.items():
+            if shortlisted:
+                yield ("shortlists", job_id, round_name)
+
+
+def contribution(student, companies, result=None):
+    # Counter of (section, key[, round]) -> count for one student,
+    # added into result when given
+    result = Counter() if result is None else result
+    if student is not None:
+        result.update(_keys(student, companies))
+    return result
+
+
+def _bump(counters, key, n):
+    if key == ("placed",):
+        counters["placed"] += n
+        return
+    section, *path = key
+    table = counters[section]
+    for part in path[:-1]:
+        table = table.setdefault(part, {})
+    table[path[-1]] = table.get(path[-1], 0) + n
+    if table[path[-1]] == 0:
+        del table[path[-1]]
+        if len(path) > 1 and not table:
+            del counters[section][path[0]]
+
+
+def apply_delta(counters, before, after):
+    delta = Counter(after)
+    delta.subtract(before)
+    for key, n in delta.items():
+        if n:
+            _bump(counters, key, n)
+    return counters
+
+
+def compute(students, companies):
+    # Full rebuild: every student's keys counted in one pandas pass rather
+    # than a Counter per student
+    keys = pd.Series([key for student in students for key in _keys(student, companies)], dtype=object)
+    return apply_delta(empty(), {}, {key: int(n) for key, n in keys.value_counts(sort=False).items()})
+
+
+# --------- Storage ---------
+# Writes go straight to the file under its lock, so updates from several
+# processes can't lose each other's changes (save_data's group commit takes
+# that same lock, so it isn't used here)
+def load():
+    # None until the first rebuild
+    try:
+        counters = data_utils.load_data(COUNTERS_FILE)
+    except ValueError:
+        return None
+    return counters or None
+
+
+def _write(counters):
+    data_utils.atomic_write(COUNTERS_FILE, counters)
+    data_utils.invalidate(COUNTERS_FILE)
+
+
+def save(counters):
+    with _lock, data_utils.file_lock(COUNTERS_FILE):
+        _write(counters)
+
+
+def update(before, after):
+    # Applies one student's change; no-op until the counters have been built
+    if before == after:
+        return
+    with _lock, data_utils.file_lock(COUNTERS_FILE):
+        try:
+            counters = data_utils.read_file(COUNTERS_FILE)
+        except (FileNotFoundError, ValueError):
+            return
+        if counters:
+            _write(apply_delta(counters, before, after))
+
+
+# Rows for the SQLite counters table: (section, key, round, n), with key and
+# round "" where the section has none
+def to_rows(counters):
+    rows = [("placed", "", "", counters["placed"])]
+    for section in SECTIONS:
+        for key, value in counters[section].items():
+            if isinstance(value, dict):
+                rows.extend((section, key, round_name, n) for round_name, n in value.items())
+            else:
+                rows.append((section, key, "", value))
+    return rows
+
+
+def from_rows(rows):
+    counters = empty()
+    for section, key, round_name, n in rows:
+        if section == "placed":
+            counters["placed"] = n
+        elif section == "shortlists":
+            counters[section].setdefault(key, {})[round_name] = n
+        else:
+            counters[section][key] = n
+    return counters
+
+
+def delta_rows(before, after):
+    delta = Counter(after)
+    delta.subtract(before)
+    return [(key[0], key[1] if len(key) > 1 else "", key[2] if len(key) > 2 else "", n)
+            for key, n in delta.items() if n]
+
+
+def diff(stored, live):
+    # Human-readable differences between two counter dicts
+    problems = []
+    if stored.get("placed") != live["placed"]:
+        problems.append(f"placed: stored {stored.get('placed')}, live {live['placed']}")
+    for section in SECTIONS:
+        a, b = stored.get(section, {}), live[section]
+        for key in sorted(set(a) | set(b), key=str):
+            if a.get(key) != b.get(key):
+                problems.append(f"{section}[{key}]: stored {a.get(key)}, live {b.get(key)}")
+    return problems
+
+
+if __name__ == "__main__":
+    import repository
+
+    parser = argparse.ArgumentParser(description="Materialized placement counters")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="Recompute the counters from the live data")
+    sub.add_parser("verify", help="Check the stored counters against the live data")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        live = repository.rebuild_counters()
+        print(f"Rebuilt the counters: {live['placed']} placed students")
+    else:
+        live = repository.compute_counters()
+        stored = repository.stored_counters()
+        problems = diff(stored, live) if stored is not None else ["The counters have not been built"]
+        for problem in problems:
+            print(problem)
+        print("OK" if not problems else f"{len(problems)} mismatches")
+        sys.exit(1 if problems else 0)
@@ -1,16 +1,377 @@
 import json
 import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
 
-def load_data(filename):
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# On-disk format for the data files, readers detect it so files can be switched at any time:
+# "json" (indented, the original format), "json-compact", "pickle" or "msgpack"
+DATA_FORMAT = os.getenv("PLACEMENT_DATA_FORMAT", "json")
+
+# Saves arriving within this many seconds are written together in one commit
+GROUP_COMMIT_WINDOW = float(os.getenv("GROUP_COMMIT_WINDOW", "0.02"))
+
+# Process-wide cache of parsed files: key -> (paths, signature, value)
+# An entry is reused while the mtime/size of its files is unchanged
+_cache = {}
+
+def file_signature(*paths):
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+def cached(key, paths, loader):
+    signature = file_signature(*paths)
+    entry = _cache.get(key)
+    if entry is not None and entry[1] == signature:
+        return entry[2]
+    value = loader()
+    _cache[key] = (paths, signature, value)
+    return value
+
+def invalidate(path):
+    for key, entry in list(_cache.items()):
+        if path in entry[0]:
+            _cache.pop(key, None)
+
+# --------- Serializers ---------
+# Binary snapshots start with a header: magic, format version, payload type.
+# JSON files never start with the magic, so the two can't be confused.
+SNAPSHOT_MAGIC = b"PPSNAP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_TYPES = {"pickle": 1, "msgpack": 2}
+
+def _encode(value):
+    # Record objects (see records.py) and dates are written as plain JSON values
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+def _plain(data):
+    if isinstance(data, list):
+        return [item.to_dict() if hasattr(item, "to_dict") else item for item in data]
+    return data
+
+def dumps(data, fmt=None):
+    fmt = fmt or DATA_FORMAT
+    if fmt == "json":
+        return json.dumps(data, indent=4, default=_encode).encode()
+    if fmt == "json-compact":
+        return json.dumps(data, separators=(",", ":"), default=_encode).encode()
+    # Binary snapshots hold plain data too, so they don't depend on the record classes
+    data = _plain(data)
+    if fmt == "pickle":
+        payload = pickle.dumps(data, protocol=5)
+    elif fmt == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("msgpack format needs the msgpack package (pip install msgpack)")
+        payload = msgpack.packb(data, default=_encode)
+    else:
+        raise ValueError(f"Unknown data format: {fmt}")
+    return SNAPSHOT_MAGIC + bytes([SNAPSHOT_VERSION, SNAPSHOT_TYPES[fmt]]) + payload
+
+def loads(raw):
+    if not raw.startswith(SNAPSHOT_MAGIC):
+        return json.loads(raw)
+    version, kind = raw[len(SNAPSHOT_MAGIC)], raw[len(SNAPSHOT_MAGIC) + 1]
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    payload = memoryview(raw)[len(SNAPSHOT_MAGIC) + 2:]
+    if kind == SNAPSHOT_TYPES["pickle"]:
+        return pickle.loads(payload)
+    if kind == SNAPSHOT_TYPES["msgpack"]:
+        if msgpack is None:
+            raise RuntimeError("This file is a msgpack snapshot, install the msgpack package to read it")
+        return msgpack.unpackb(payload)
+    raise ValueError(f"Unknown snapshot type {kind}")
+
+def read_file(filename):
+    with open(filename, "rb") as f:
+        return loads(f.read())
+
+def load_data(filename, parse=None):
+    # A save still waiting for its group commit is what readers should see
+    pending = _pending_data(filename)
+    if pending is not None:
+        data, saved_parse = pending
+        if saved_parse is parse:
+            return data
+        # Loaded differently than it was saved: hand out a fresh copy
+        plain = loads(dumps(data, "json-compact"))
+        return parse(plain) if parse else plain
+
+    # parse(data) runs once per file version, callers share the parsed result
+    def read():
+        try:
+            data = read_file(filename)
+        except FileNotFoundError:
+            return []
+        return parse(data) if parse else data
+
+    return cached((filename, parse), (filename,), read)
+
+# --------- Writes ---------
+@contextmanager
+def file_lock(path):
+    # Advisory lock on a sidecar file, shared by every process writing path
+    with open(path + ".lock", "a+") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def atomic_write(filename, data):
+    # Readers only ever see the old or the new file, never a truncated one
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(filename) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(dumps(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if fcntl:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+# Group commit: the first saver becomes the leader, waits GROUP_COMMIT_WINDOW
+# and writes every file saved meanwhile; the others wait for that commit
+_commit_cond = threading.Condition()
+_pending = {}       # filename -> data waiting for the next commit
+_writing = {}       # filename -> data being written by the current commit
+_collecting = False
+_batch = 0          # id of the batch currently collecting saves
+_committed = -1     # id of the last finished batch
+_errors = {}        # batch id -> exception raised while writing it
+
+def _pending_data(filename):
+    # (data, parse) of the newest uncommitted save, or None
+    with _commit_cond:
+        if filename in _pending:
+            return _pending[filename]
+        return _writing.get(filename)
+
+def _commit(batch_id, batch):
+    # batch: filename -> (data, parse)
+    global _committed
+    # Batches are written in order so an older batch never overwrites a newer one
+    with _commit_cond:
+        while _committed < batch_id - 1:
+            _commit_cond.wait()
+
+    error = None
     try:
-        with open(filename, "r") as f:
-            return json.load(f)
+        for filename, (data, parse) in batch.items():
+            with file_lock(filename):
+                atomic_write(filename, data)
+                # What we just wrote is the new version, no need to parse it back
+                invalidate(filename)
+                _cache[(filename, parse)] = ((filename,), file_signature(filename), data)
+    except Exception as e:
+        error = e
+    with _commit_cond:
+        for filename in batch:
+            if _writing.get(filename) is batch[filename]:
+                del _writing[filename]
+        if error is not None:
+            _errors[batch_id] = error
+        _committed = batch_id
+        _commit_cond.notify_all()
+
+def save_data(filename, data, parse=None):
+    # parse: the load_data parser that produced data, its cache entry is kept warm
+    global _collecting, _batch
+    with _commit_cond:
+        _pending[filename] = (data, parse)
+        invalidate(filename)
+        batch_id = _batch
+        leader = not _collecting
+        _collecting = True
+
+    if leader:
+        if GROUP_COMMIT_WINDOW > 0:
+            time.sleep(GROUP_COMMIT_WINDOW)
+        with _commit_cond:
+            batch = dict(_pending)
+            _pending.clear()
+            _writing.update(batch)
+            _collecting = False
+            _batch += 1
+        _commit(batch_id, batch)
+
+    with _commit_cond:
+        while _committed < batch_id:
+            _commit_cond.wait()
+        error = _errors.get(batch_id)
+    if error is not None:
+        raise error
+
+# --------- Line-delimited files ---------
+# Append-only data (notifications, queries, responses) is kept one compact JSON
+# record per line: appends are O(1) and readers can stop after the rows they need.
+# Each record is identified by the byte offset of its line.
+
+def append_line(filename, record):
+    append_lines(filename, [record])
+
+def append_lines(filename, records):
+    # All records in one write, on disk before the lock is released
+    lines = "".join(json.dumps(record, separators=(",", ":"), default=_encode) + "\n" for record in records)
+    with file_lock(filename), open(filename, "a") as f:
+        f.write(lines)
+        f.flush()
+        os.fsync(f.fileno())
+    invalidate(filename)
+
+def read_new_lines(filename, offset):
+    # Records appended after byte offset, and the offset to continue from
+    records = []
+    try:
+        with open(filename, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # half-written last line, picked up next time
+                offset += len(line)
+                if line.strip():
+                    records.append(json.loads(line))
     except FileNotFoundError:
-        return []
+        pass
+    return records, offset
+
+def compact_lines(filename, keep):
+    # Rewrites the file with the records keep(record) accepts, appends wait meanwhile
+    with file_lock(filename):
+        records = [record for _, record in iter_lines(filename) if keep(record)]
+        _replace_lines(filename, records)
+    invalidate(filename)
 
-def save_data(filename, data):
-    with open(filename, "w") as f:
-        json.dump(data, f, indent=4)
+def _replace_lines(filename, records):
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(filename) + ".", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        for record in records:
+            f.write(json.dumps(record, separators=(",", ":"), default=_encode) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filename)
+
+def convert_to_lines(legacy, filename):
+    # One-time conversion of a JSON array file into a line file
+    with file_lock(filename):
+        if not os.path.exists(filename):
+            _replace_lines(filename, read_file(legacy))
+    invalidate(filename)
+
+def _matcher(where):
+    # Cheap byte check on the raw line first, so most non-matching lines are never parsed
+    if not where:
+        return None, None
+    needles = [json.dumps(value).encode() for value in where.values()]
+
+    def raw_ok(line):
+        return all(needle in line for needle in needles)
+
+    def record_ok(record):
+        return all(record.get(key) == value for key, value in where.items())
+
+    return raw_ok, record_ok
+
+def _iter_forward(f):
+    offset = 0
+    for line in f:
+        if not line.endswith(b"\n"):
+            break  # half-written last line
+        yield offset, line
+        offset += len(line)
+
+def _iter_backward(f, block_size=64 * 1024):
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    tail = b""
+    ended = False  # past the newline that ends the last complete line
+    while pos > 0:
+        step = min(block_size, pos)
+        pos -= step
+        f.seek(pos)
+        chunk = f.read(step) + tail
+        pieces = chunk.split(b"\n")
+        if not ended:
+            if len(pieces) == 1:
+                tail = b""  # all of it belongs to a half-written last line
+                continue
+            # the piece after the last newline is empty, or a half-written line
+            pieces.pop()
+            ended = True
+        tail = pieces.pop(0)
+        start = pos + len(tail) + 1
+        starts = []
+        for piece in pieces:
+            starts.append(start)
+            start += len(piece) + 1
+        for piece, piece_start in zip(reversed(pieces), reversed(starts)):
+            yield piece_start, piece
+    if tail:
+        yield 0, tail
+
+def iter_lines(filename, where=None, newest_first=False, limit=None):
+    # Yields (offset, record) lazily; where={"key": value} keeps exact matches only
+    raw_ok, record_ok = _matcher(where)
+    try:
+        f = open(filename, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        count = 0
+        lines = _iter_backward(f) if newest_first else _iter_forward(f)
+        for offset, line in lines:
+            if limit is not None and count >= limit:
+                return
+            if not line.strip() or (raw_ok and not raw_ok(line)):
+                continue
+            record = json.loads(line)
+            if record_ok and not record_ok(record):
+                continue
+            count += 1
+            yield offset, record
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
@@ -0,0 +1,194 @@
+import argparse
+import csv
+import os
+import zipfile
+from datetime import date, datetime
+
+import repository
+from counters import placements
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Bulk export of the portal data for reporting, one file per table. Rows are
+# generated from the records load_students/load_companies already hold and
+# written CHUNK_ROWS at a time, so no second full copy is built in memory.
+CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "10000"))
+FORMATS = ("csv", "parquet")
+
+# table -> [(column, type)]
+TABLES = {
+    "students": [("student_id", "str"), ("name", "str"), ("email", "str"), ("branch", "str"),
+                 ("cgpa", "float"), ("placed", "bool")],
+    "applications": [("student_id", "str"), ("company_name", "str"), ("job_id", "str")],
+    "shortlists": [("student_id", "str"), ("job_id", "str"), ("round", "str")],
+    "selections": [("student_id", "str"), ("job_id", "str"), ("company_name", "str"), ("drive_year", "int")],
+    "companies": [("job_id", "str"), ("name", "str"), ("role", "str"), ("package", "float"),
+                  ("min_cgpa", "float"), ("eligible_departments", "str"), ("date_of_drive", "date"),
+                  ("completed", "bool")],
+}
+
+
+def _value(value, kind):
+    if value is None:
+        return None
+    try:
+        if kind == "float":
+            return float(value)
+        if kind == "int":
+            return int(value)
+        if kind == "bool":
+            return bool(value)
+        if kind == "date":
+            return value if isinstance(value, date) else date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return str(value)
+
+
+# --------- Rows ---------
+def _student_rows(companies):
+    for s in repository.load_students():
+        yield (repository.student_key(s), s.get("name"), s.get("email"), s.get("branch"), s.get("cgpa"),
+               bool(placements(s, companies)))
+
+
+def _application_rows(companies):
+    for s in repository.load_students():
+        for company_name in s.get("applications") or ():
+            company = companies["by_name"].get(company_name)
+            yield repository.student_key(s), company_name, company.get("job_id") if company is not None else None
+
+
+def _shortlist_rows(companies):
+    for s in repository.load_students():
+        for job_id, rounds in (s.get("shortlists") or {}).items():
+            for round_name, shortlisted in rounds.items():
+                if shortlisted:
+                    yield repository.student_key(s), job_id, round_name
+
+
+def _selection_rows(companies):
+    for s in repository.load_students():
+        student_id = repository.student_key(s)
+        job_ids = s.get("selected") or ()
+        for job_id in job_ids:
+            company = companies["by_job_id"].get(job_id)
+            yield (student_id, job_id, company["name"] if company is not None else None,
+                   companies["year_by_job_id"].get(job_id))
+        if not job_ids and s.get("selected_company"):
+            # Older records only name the company
+            for company_name, year, company in placements(s, companies):
+                yield student_id, company.get("job_id") if company is not None else None, company_name, year
+
+
+def _company_rows(companies):
+    for c in repository.load_companies():
+        yield (c.get("job_id"), c.get("name"), c.get("role"), c.get("package"), c.get("min_cgpa"),
+               ", ".join(c.get("eligible_departments") or ()), c.get("date_of_drive"), c.get("completed"))
+
+
+ROWS = {
+    "students": _student_rows,
+    "applications": _application_rows,
+    "shortlists": _shortlist_rows,
+    "selections": _selection_rows,
+    "companies": _company_rows,
+}
+
+
+def rows(table):
+    kinds = [kind for _, kind in TABLES[table]]
+    for row in ROWS[table](repository.company_index()):
+        yield tuple(_value(v, kind) for v, kind in zip(row, kinds))
+
+
+def _chunks(table):
+    chunk = []
+    for row in rows(table):
+        chunk.append(row)
+        if len(chunk) >= CHUNK_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# --------- Writers ---------
+def write_csv(table, path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([column for column, _ in TABLES[table]])
+        for chunk in _chunks(table):
+            writer.writerows(chunk)
+
+
+def _arrow_type(kind):
+    return {"str": pa.string(), "float": pa.float64(), "int": pa.int64(), "bool": pa.bool_(),
+            "date": pa.date32()}[kind]
+
+
+def write_parquet(table, path):
+    # One row group per chunk
+    if pq is None:
+        raise RuntimeError("Parquet export needs the pyarrow package (pip install pyarrow)")
+    schema = pa.schema([(column, _arrow_type(kind)) for column, kind in TABLES[table]])
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in _chunks(table):
+            arrays = [pa.array(column, type=field.type) for column, field in zip(zip(*chunk), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        # an empty table still gets a file with the schema
+
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet}
+
+
+def available_formats():
+    return FORMATS if pq is not None else ("csv",)
+
+
+def export(out_dir, formats=None):
+    # Returns the paths written
+    formats = formats or available_formats()
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for table in TABLES:
+        for fmt in formats:
+            path = os.path.join(out_dir, f"{table}.{fmt}")
+            WRITERS[fmt](table, path)
+            paths.append(path)
+    return paths
+
+
+def export_zip(out_dir, formats=None):
+    # The exported files plus a zip of them, for the admin download button
+    paths = export(out_dir, formats)
+    zip_path = out_dir.rstrip(os.sep) + ".zip"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for path in paths:
+            zf.write(path, os.path.basename(path))
+    return zip_path
+
+
+def default_dir():
+    return os.path.join("exports", datetime.now().strftime("%Y%m%d-%H%M%S"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export students, applications, shortlists, selections and companies")
+    parser.add_argument("--out", default=None, help="Output directory (default exports/<timestamp>)")
+    parser.add_argument("--format", choices=FORMATS + ("all",), default="all",
+                        help="all = csv, plus parquet when pyarrow is installed")
+    parser.add_argument("--zip", action="store_true", help="Also write a zip of the exported files")
+    args = parser.parse_args()
+
+    formats = None if args.format == "all" else (args.format,)
+    out_dir = args.out or default_dir()
+    if args.zip:
+        print(export_zip(out_dir, formats))
+    else:
+        for path in export(out_dir, formats):
+            print(path)
@@ -0,0 +1,204 @@
+import os
+import smtplib
+import threading
+import time
+from collections import Counter
+from email.message import EmailMessage
+
+# SMTP delivery for the outbox worker (see outbox.py), over a small pool of
+# authenticated sessions that are kept open between batches. Messages are
+# dicts with to, subject and body; the sender address is EMAIL_USER.
+#   SMTP_HOST / SMTP_PORT   server, smtp.gmail.com:587 (465 with SMTP_SSL=1)
+#   SMTP_SSL=1              implicit TLS; otherwise STARTTLS when the server offers it
+#   SMTP_POOL_SIZE          most sessions open at once, idle ones included
+# A session idle for more than NOOP_AFTER seconds is checked with NOOP before
+# reuse, one idle for more than MAX_IDLE is closed, and one that has sent
+# MAX_MESSAGES is replaced by a fresh login.
+HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+USE_SSL = os.getenv("SMTP_SSL", "0") == "1"
+PORT = int(os.getenv("SMTP_PORT", "465" if USE_SSL else "587"))
+POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+NOOP_AFTER = float(os.getenv("SMTP_NOOP_AFTER", "10"))
+MAX_IDLE = float(os.getenv("SMTP_MAX_IDLE", "120"))
+MAX_MESSAGES = int(os.getenv("SMTP_MAX_MESSAGES", "100"))
+
+# connects, reused, noop_failures, reconnects, sent
+stats = Counter()
+
+_idle = []
+_idle_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(POOL_SIZE)
+
+
+class _Session:
+    __slots__ = ("smtp", "last_used", "sent")
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+
+def build_message(message):
+    msg = EmailMessage()
+    msg["Subject"] = message["subject"]
+    msg["From"] = os.getenv("EMAIL_USER")
+    msg["To"] = message["to"]
+    msg.set_content(message["body"])
+    return msg
+
+
+def _error(e, permanent=False):
+    return f"{type(e).__name__}: {e}", permanent
+
+
+def _permanent(e):
+    # Rejected for good (5xx, malformed message); 4xx, connection problems and
+    # Gmail's sending-limit replies (5.4.5) may go through later
+    if isinstance(e, ValueError):
+        return True
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in e.recipients.values())
+    code = getattr(e, "smtp_code", None)
+    text = getattr(e, "smtp_error", b"")
+    if isinstance(text, bytes):
+        text = text.decode(errors="replace")
+    return isinstance(code, int) and code >= 500 and "5.4.5" not in text
+
+
+# --------- Pool ---------
+def _connect():
+    if USE_SSL:
+        smtp = smtplib.SMTP_SSL(HOST, PORT, timeout=TIMEOUT)
+        smtp.ehlo()
+    else:
+        smtp = smtplib.SMTP(HOST, PORT, timeout=TIMEOUT)
+        smtp.ehlo()
+        if smtp.has_extn("starttls"):
+            smtp.starttls()
+            smtp.ehlo()
+    try:
+        user, password = os.getenv("EMAIL_USER"), os.getenv("EMAIL_PASS")
+        if user and password and smtp.has_extn("auth"):
+            smtp.login(user, password)
+    except Exception:
+        _close(smtp)
+        raise
+    stats["connects"] += 1
+    return _Session(smtp)
+
+
+def _close(smtp):
+    try:
+        smtp.quit()
+    except Exception:
+        smtp.close()
+
+
+def _alive(session):
+    try:
+        return session.smtp.noop()[0] == 250
+    except Exception:
+        return False
+
+
+def _checkout():
+    # Blocks while POOL_SIZE sessions are in use
+    _slots.acquire()
+    try:
+        while True:
+            with _idle_lock:
+                session = _idle.pop() if _idle else None
+            if session is None:
+                return _connect()
+            idle = time.monotonic() - session.last_used
+            if idle > MAX_IDLE:
+                _close(session.smtp)
+            elif idle > NOOP_AFTER and not _alive(session):
+                stats["noop_failures"] += 1
+                _close(session.smtp)
+            else:
+                stats["reused"] += 1
+                return session
+    except BaseException:
+        _slots.release()
+        raise
+
+
+def _checkin(session, broken=False):
+    if broken or session.sent >= MAX_MESSAGES:
+        _close(session.smtp)
+    else:
+        session.last_used = time.monotonic()
+        with _idle_lock:
+            _idle.append(session)
+    _slots.release()
+
+
+def close_all():
+    with _idle_lock:
+        sessions = list(_idle)
+        _idle.clear()
+    for session in sessions:
+        _close(session.smtp)
+
+
+def reset(pool_size=None):
+    # Closes idle sessions and picks up changed settings; call with nothing in flight
+    global POOL_SIZE, _slots
+    close_all()
+    POOL_SIZE = pool_size or POOL_SIZE
+    _slots = threading.BoundedSemaphore(POOL_SIZE)
+    stats.clear()
+
+
+# --------- Sending ---------
+def _dropped(e):
+    # The session is gone: a disconnect, a socket error or 421 (service closing)
+    if isinstance(e, smtplib.SMTPServerDisconnected) or getattr(e, "smtp_code", None) == 421:
+        return True
+    return isinstance(e, OSError) and not isinstance(e, smtplib.SMTPException)
+
+
+def send_batch(messages):
+    # None per sent message, (error, permanent) per failed one. A session that
+    # drops mid-batch is replaced once per message before that message counts
+    # as failed.
+    results = []
+    session = None
+    try:
+        for n, message in enumerate(messages):
+            error = None
+            for attempt in range(2):
+                if session is None:
+                    try:
+                        session = _checkout()
+                    except Exception as e:
+                        results.extend([_error(e)] * (len(messages) - n))
+                        return results
+                try:
+                    session.smtp.send_message(build_message(message))
+                    session.sent += 1
+                    stats["sent"] += 1
+                    error = None
+                    break
+                except (smtplib.SMTPException, OSError, ValueError) as e:
+                    error = _error(e, _permanent(e))
+                    if not _dropped(e):
+                        break  # refused by the server; the session itself is still usable
+                    _checkin(session, broken=True)
+                    session = None
+                    stats["reconnects"] += 1
+            results.append(error)
+            if session is not None and session.sent >= MAX_MESSAGES:
+                _checkin(session)
+                session = None
+    finally:
+        if session is not None:
+            _checkin(session)
+    return results
+
+
+def send(message):
+    return send_batch([message])[0]
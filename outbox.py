@@ -0,0 +1,265 @@
+import argparse
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import data_utils
+import mail_transport
+
+# Outgoing email. The pages only append to OUTBOX_FILE and return; a worker
+# thread delivers in the background. The file is an append-only event log,
+# one line per event:
+#   {"id", "event": "queued", "to", "subject", "body", "group", "at"}
+#   {"id", "event": "sent", "attempts", "at"}
+#   {"id", "event": "failed", "error", "attempts", "next_at", "at"}   retried at next_at
+#   {"id", "event": "dead", "error", "attempts", "at"}                copied to DEAD_FILE
+#   {"id", "event": "replayed", "at"}                                 requeued from DEAD_FILE
+# A message's status is its latest event: queued, retrying, sent, dead or
+# replayed. Messages still queued or retrying when the app stops go out after
+# the next start. Run one app process per outbox file, or two workers would
+# both send the same messages.
+# Bulk sends (a notification fanned out to a job's students) share a group, so
+# their progress can be followed; messages without one go out first, and
+# delivery is paced to RATE_PER_MINUTE (0 = no limit).
+OUTBOX_FILE = os.getenv("OUTBOX_FILE", "outbox.jsonl")
+POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+RATE_PER_MINUTE = float(os.getenv("OUTBOX_RATE_PER_MINUTE", "300"))
+# Once the file passes COMPACT_BYTES, only the latest KEEP_DONE finished messages are kept
+COMPACT_BYTES = int(os.getenv("OUTBOX_COMPACT_BYTES", str(4 * 1024 * 1024)))
+KEEP_DONE = int(os.getenv("OUTBOX_KEEP_DONE", "1000"))
+
+# Failed sends are retried after RETRY_BASE * 2^(attempts - 1) seconds, capped
+# at RETRY_MAX and jittered to between half and all of that, so a burst of
+# throttled messages doesn't come back all at once. A message rejected for good
+# or still failing after MAX_ATTEMPTS goes to DEAD_FILE, from where it can be
+# replayed.
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+RETRY_BASE = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "30"))
+RETRY_MAX = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "3600"))
+DEAD_FILE = os.getenv("OUTBOX_DEAD_FILE", "outbox.dead.jsonl")
+
+STATUSES = ("queued", "retrying", "sent", "dead", "replayed")
+FINISHED = ("sent", "dead", "replayed")
+
+_lock = threading.RLock()
+_state = {"offset": 0, "messages": {}}  # id -> message with its status, in queue order
+_wake = threading.Event()
+_worker = None
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _apply(event):
+    messages = _state["messages"]
+    if event["event"] == "queued":
+        messages.setdefault(event["id"], {"id": event["id"], "to": event["to"], "subject": event["subject"],
+                                          "body": event["body"], "group": event.get("group"),
+                                          "queued_at": event["at"], "status": "queued", "error": None,
+                                          "attempts": 0, "next_at": None, "done_at": None})
+        return
+    message = messages.get(event["id"])
+    if message is None:
+        return
+    if event["event"] == "failed":
+        message.update(status="retrying", error=event.get("error"), attempts=event.get("attempts", 1),
+                       next_at=event.get("next_at"))
+    else:
+        error = None if event["event"] == "sent" else event.get("error", message["error"])
+        message.update(status=event["event"], error=error,
+                       attempts=event.get("attempts", message["attempts"]), next_at=None, done_at=event["at"])
+
+
+def _refresh():
+    # Reads what other threads and processes appended since the last call.
+    # Returns the messages copied under the lock: the worker keeps adding to the dict
+    with _lock:
+        try:
+            size = os.path.getsize(OUTBOX_FILE)
+        except FileNotFoundError:
+            size = 0
+        if size < _state["offset"]:
+            _state.update(offset=0, messages={})  # compacted
+        events, _state["offset"] = data_utils.read_new_lines(OUTBOX_FILE, _state["offset"])
+        for event in events:
+            _apply(event)
+        return list(_state["messages"].values())
+
+
+def _queued_events(messages, group=None):
+    at = _now()
+    return [dict({"group": group}, **message, id=uuid.uuid4().hex, event="queued", at=at) for message in messages]
+
+
+# --------- Request path ---------
+def enqueue(to, subject, body):
+    return enqueue_many([{"to": to, "subject": subject, "body": body}])[0]
+
+
+def enqueue_many(messages, group=None):
+    # Returns the message ids; one append however many messages
+    events = _queued_events(messages, group)
+    if events:
+        data_utils.append_lines(OUTBOX_FILE, events)
+        start_worker()
+    return [event["id"] for event in events]
+
+
+def counts(group=None):
+    # Messages per status; queued is still pending its first attempt
+    result = dict.fromkeys(STATUSES, 0)
+    for message in _refresh():
+        if group is None or message["group"] == group:
+            result[message["status"]] += 1
+    return result
+
+
+def groups(limit=10):
+    # group -> status counts for the latest groups, newest first
+    result = {}
+    for message in reversed(_refresh()):
+        group = message["group"]
+        if group is None:
+            continue
+        if group not in result:
+            if len(result) >= limit:
+                continue
+            result[group] = dict.fromkeys(STATUSES, 0)
+        result[group][message["status"]] += 1
+    return result
+
+
+def recent(limit=50):
+    # Newest first
+    return _refresh()[::-1][:limit]
+
+
+# --------- Dead letters ---------
+def dead_letters(limit=None):
+    # Newest first
+    return [record for _, record in data_utils.iter_lines(DEAD_FILE, newest_first=True, limit=limit)]
+
+
+def replay_dead(ids=None):
+    # Requeues dead letters (all, or those in ids) as new messages with fresh
+    # attempt counts; returns how many
+    with _lock:
+        chosen = [r for _, r in data_utils.iter_lines(DEAD_FILE) if ids is None or r["id"] in ids]
+        if not chosen:
+            return 0
+        at = _now()
+        events = []
+        for r in chosen:
+            events.extend(_queued_events([{"to": r["to"], "subject": r["subject"], "body": r["body"],
+                                           "replay_of": r["id"]}], r.get("group")))
+            events.append({"id": r["id"], "event": "replayed", "at": at})
+        # Requeued before they leave the dead-letter file: a crash in between
+        # sends twice rather than never
+        data_utils.append_lines(OUTBOX_FILE, events)
+        replayed = {r["id"] for r in chosen}
+        data_utils.compact_lines(DEAD_FILE, lambda r: r["id"] not in replayed)
+    _wake.set()
+    return len(chosen)
+
+
+# --------- Worker ---------
+def _pending(limit):
+    now = time.time()
+    with _lock:
+        pending = [m for m in _refresh()
+                   if m["status"] == "queued" or (m["status"] == "retrying" and (m["next_at"] or 0) <= now)]
+    pending.sort(key=lambda m: m["group"] is not None)
+    return pending[:limit]
+
+
+def backoff(attempts):
+    delay = min(RETRY_MAX, RETRY_BASE * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def _outcome(message, failure, at):
+    attempts = message["attempts"] + 1
+    if failure is None:
+        return {"id": message["id"], "event": "sent", "attempts": attempts, "at": at}
+    error, permanent = failure
+    if permanent or attempts >= MAX_ATTEMPTS:
+        return {"id": message["id"], "event": "dead", "error": error, "attempts": attempts, "at": at}
+    return {"id": message["id"], "event": "failed", "error": error, "attempts": attempts,
+            "next_at": time.time() + backoff(attempts), "at": at}
+
+
+def deliver_pending():
+    # Sends everything due, BATCH_SIZE messages per SMTP session; returns how many were sent
+    sent = 0
+    while True:
+        batch = _pending(BATCH_SIZE)
+        if not batch:
+            break
+        started = time.monotonic()
+        failures = mail_transport.send_batch(batch)
+        at = _now()
+        outcomes = [_outcome(m, failure, at) for m, failure in zip(batch, failures)]
+        dead = [dict(m, error=o["error"], attempts=o["attempts"], dead_at=at)
+                for m, o in zip(batch, outcomes) if o["event"] == "dead"]
+        if dead:
+            data_utils.append_lines(DEAD_FILE, [{k: m[k] for k in ("id", "to", "subject", "body", "group", "error",
+                                                                  "attempts", "queued_at", "dead_at")}
+                                                for m in dead])
+        data_utils.append_lines(OUTBOX_FILE, outcomes)
+        sent += failures.count(None)
+        if RATE_PER_MINUTE:
+            time.sleep(max(0.0, len(batch) * 60 / RATE_PER_MINUTE - (time.monotonic() - started)))
+    _compact()
+    return sent
+
+
+def _compact():
+    with _lock:
+        _refresh()
+        messages = _state["messages"]
+        if _state["offset"] < COMPACT_BYTES:
+            return
+        done = [i for i, m in messages.items() if m["status"] in FINISHED]
+        drop = set(done[:-KEEP_DONE] if KEEP_DONE else done)
+        if drop:
+            data_utils.compact_lines(OUTBOX_FILE, lambda event: event["id"] not in drop)
+            _state.update(offset=0, messages={})
+
+
+def _run():
+    while True:
+        _wake.wait(POLL_SECONDS)
+        _wake.clear()
+        try:
+            deliver_pending()
+        except Exception as e:
+            print("Outbox worker error:", e)
+
+
+def start_worker():
+    # One worker per process, started on first use
+    global _worker
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name="outbox-worker", daemon=True)
+            _worker.start()
+    _wake.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Email outbox")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Print message counts per status")
+    sub.add_parser("replay", help="Requeue every dead letter")
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        print(f"Requeued {replay_dead()} dead letters; they are sent by the app's worker")
+    else:
+        for name, n in counts().items():
+            print(f"{name}: {n}")
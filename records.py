@@ -0,0 +1,244 @@
+import sys
+from datetime import date
+from typing import TypedDict
+
+# Compact record classes for the data the repository hands out.
+# They keep the dict interface the pages already use (s["name"], s.get(...),
+# "key" in s, s.setdefault(...), s.update(...)) but store fields in __slots__,
+# hold numbers and dates as real types, and intern repeated strings
+# (branches, departments, company names, job_ids, rounds).
+
+
+class _Missing:
+    __slots__ = ()
+
+    def __reduce__(self):
+        return "_MISSING"
+
+    def __repr__(self):
+        return "<missing>"
+
+
+# Marks a field the record doesn't have, so a stored None still round-trips
+_MISSING = _Missing()
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _intern_list(values):
+    return [_intern(v) for v in values]
+
+
+def _to_float(value):
+    # Keep whatever was typed if it isn't a number
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _to_date(value):
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _to_shortlists(shortlists):
+    return {_intern(job_id): {_intern(r): status for r, status in rounds.items()}
+            for job_id, rounds in shortlists.items()}
+
+
+class Record:
+    __slots__ = ("extra",)
+    FIELDS = ()
+    CONVERTERS = {}
+    ALIASES = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_set = frozenset(cls.FIELDS)
+
+    def __init__(self, data=None):
+        for name in self.FIELDS:
+            setattr(self, name, _MISSING)
+        self.extra = None  # keys that aren't regular fields
+        if data:
+            for key, value in data.items():
+                self[key] = value
+
+    @classmethod
+    def from_dict(cls, data):
+        return data if isinstance(data, cls) else cls(data)
+
+    def _lookup(self, key):
+        key = self.ALIASES.get(key, key)
+        if key in self._field_set:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        return _MISSING
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        key = self.ALIASES.get(key, key)
+        if key in self._field_set:
+            convert = self.CONVERTERS.get(key)
+            setattr(self, key, convert(value) if convert and value is not None else value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if self._lookup(key) is _MISSING:
+            raise KeyError(key)
+        key = self.ALIASES.get(key, key)
+        if key in self._field_set:
+            setattr(self, key, _MISSING)
+        else:
+            del self.extra[key]
+
+    def __contains__(self, key):
+        return self._lookup(key) is not _MISSING
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def setdefault(self, key, default=None):
+        if self._lookup(key) is _MISSING:
+            self[key] = default
+        return self._lookup(key)
+
+    def update(self, other=(), **kwargs):
+        items = other.items() if hasattr(other, "items") else other
+        for key, value in items:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def keys(self):
+        keys = [name for name in self.FIELDS if getattr(self, name) is not _MISSING]
+        return keys + list(self.extra or ())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return self.to_dict().items()
+
+    def to_dict(self):
+        # Plain JSON-ready dict, in the same shape the data files use
+        data = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if value is _MISSING:
+                continue
+            data[name] = value.isoformat() if isinstance(value, date) else value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Student(Record):
+    FIELDS = ("name", "student_id", "email", "password", "cgpa", "branch", "applications",
+              "placed", "profile_pic", "resume", "shortlists", "selected", "selected_company")
+    __slots__ = FIELDS
+    CONVERTERS = {
+        "cgpa": _to_float,
+        "branch": _intern,
+        "applications": _intern_list,   # company names
+        "shortlists": _to_shortlists,   # job_id -> round -> True
+        "selected": _intern_list,       # job_ids
+        "selected_company": _intern,
+    }
+    # Older records use "id"; it is folded into student_id instead of stored twice
+    ALIASES = {"id": "student_id"}
+
+
+class Company(Record):
+    FIELDS = ("name", "role", "package", "min_cgpa", "eligible_departments", "date_of_drive",
+              "completed", "job_id")
+    __slots__ = FIELDS
+    CONVERTERS = {
+        "name": _intern,
+        "role": _intern,
+        "package": _to_float,
+        "min_cgpa": _to_float,
+        "eligible_departments": _intern_list,
+        "date_of_drive": _to_date,
+        "job_id": _intern,
+    }
+
+
+class Notification(Record):
+    FIELDS = ("company_name", "job_id", "role", "venue", "round", "time", "description", "meeting_link")
+    __slots__ = FIELDS
+    CONVERTERS = {
+        "company_name": _intern,
+        "job_id": _intern,
+        "role": _intern,
+        "round": _intern,
+    }
+
+
+class Query(Record):
+    FIELDS = ("student_name", "student_id", "subject", "message", "timestamp", "date")
+    __slots__ = FIELDS
+
+
+def name_key(name):
+    # Company names as typed by different people: ignore case and extra spaces
+    return " ".join(str(name).split()).casefold()
+
+
+def to_students(records):
+    return [Student.from_dict(r) for r in records]
+
+
+def to_companies(records):
+    return [Company.from_dict(r) for r in records]
+
+
+def to_notifications(records):
+    return [Notification.from_dict(r) for r in records]
+
+
+def to_queries(records):
+    return [Query.from_dict(r) for r in records]
+
+
+def to_plain(records):
+    return [r.to_dict() if isinstance(r, Record) else r for r in records]
+
+
+# Responses are only read back per student and stay plain dicts
+class ResponseRecord(TypedDict, total=False):
+    student_id: str
+    student_name: str
+    original_query: str
+    response: str
+    response_date: str
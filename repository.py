@@ -0,0 +1,626 @@
+import json
+import os
+from bisect import bisect_left
+from collections import Counter
+from contextlib import nullcontext
+from datetime import date
+from typing import List, Optional
+
+import counters
+import data_utils
+import search_index
+import sqlite_store
+import student_log
+import student_shards
+from records import (Company, Notification, Query, ResponseRecord, Student, to_companies,
+                     name_key, to_notifications, to_plain, to_queries, to_students)
+
+# The one data-access module: every page loads and saves through here, so the
+# cache, indexes and storage backend apply everywhere.
+
+# Storage backend for all portal data: "json" (the *.json files), "sqlite",
+# "log" (json files, with student changes appended to students.log) or
+# "sharded" (json files, with one file per student under students/)
+STORAGE_BACKEND = os.getenv("PLACEMENT_STORAGE", "json").lower()
+
+STUDENTS_FILE = "students.json"
+COMPANIES_FILE = "companies.json"
+# Append-only data, one JSON record per line
+NOTIFICATIONS_FILE = "notifications.jsonl"
+QUERIES_FILE = "queries.jsonl"
+RESPONSES_FILE = "responses.jsonl"
+
+
+def use_sqlite():
+    return STORAGE_BACKEND == "sqlite"
+
+
+def use_log():
+    return STORAGE_BACKEND == "log"
+
+
+def use_sharded():
+    return STORAGE_BACKEND == "sharded"
+
+
+def _sqlite_cached(name, loader, parse=None):
+    # The WAL file changes on every commit, so it is part of the signature
+    db = sqlite_store.DB_FILE
+    sqlite_store.get_connection()  # opening the db creates the WAL file
+    if parse:
+        return data_utils.cached(("sqlite", name, parse), (db, db + "-wal"), lambda: parse(loader()))
+    return data_utils.cached(("sqlite", name, None), (db, db + "-wal"), loader)
+
+
+def _sqlite_changed():
+    data_utils.invalidate(sqlite_store.DB_FILE)
+
+
+def _transaction():
+    # On SQLite, student writes and their counter updates inside commit together
+    return sqlite_store.transaction() if use_sqlite() else nullcontext()
+
+
+def _record(cls, data):
+    return cls.from_dict(data) if data is not None else None
+
+
+def student_key(student):
+    # Older records only have "id"
+    return student.get("student_id") or student.get("id")
+
+
+# --------- Indexes ---------
+# Lookup dicts over the cached lists. The cache hands out the same list object
+# until the data changes, so a different object means a new data version; the
+# log backend replays into one list, so its indexes also carry
+# student_log.version(). Single-record writes keep the list object and patch
+# the index in place.
+_indexes = {}
+
+
+def _build_student_index(students):
+    by_id, by_email = {}, {}
+    for s in students:
+        for key in (s.get("student_id"), s.get("id")):
+            if key:
+                by_id.setdefault(key, s)
+        if s.get("email"):
+            by_email.setdefault(s["email"], s)
+    return {"by_id": by_id, "by_email": by_email}
+
+
+def _build_company_index(companies):
+    # by_name_key uses name_key() so older selected_company values still match;
+    # drive years are parsed here once per data version
+    by_job_id, by_name, by_name_key = {}, {}, {}
+    year_by_job_id, year_by_name_key = {}, {}
+    for c in companies:
+        try:
+            year = drive_year(c)
+        except (TypeError, ValueError, AttributeError):
+            year = None
+        if c.get("job_id"):
+            by_job_id.setdefault(c["job_id"], c)
+            if year is not None:
+                year_by_job_id.setdefault(c["job_id"], year)
+        if c.get("name"):
+            by_name.setdefault(c["name"], c)
+            by_name_key.setdefault(name_key(c["name"]), c)
+            if year is not None:
+                year_by_name_key.setdefault(name_key(c["name"]), year)
+    return {"by_job_id": by_job_id, "by_name": by_name, "by_name_key": by_name_key,
+            "year_by_job_id": year_by_job_id, "year_by_name_key": year_by_name_key}
+
+
+def _index(name, records, build, version=None):
+    entry = _indexes.get(name)
+    if entry is None or entry[0] is not records or entry[1] != version:
+        entry = (records, version, build(records))
+        _indexes[name] = entry
+    return entry[2]
+
+
+def _students_version():
+    return student_log.version() if use_log() else None
+
+
+def _add_shortlists(index, student):
+    # index: job_id -> round -> sorted student ids
+    student_id = student_key(student)
+    if not student_id:
+        return
+    for job_id, rounds in (student.get("shortlists") or {}).items():
+        for round_name, shortlisted in rounds.items():
+            if shortlisted:
+                ids = index.setdefault(job_id, {}).setdefault(round_name, [])
+                i = bisect_left(ids, student_id)
+                if i == len(ids) or ids[i] != student_id:
+                    ids.insert(i, student_id)
+
+
+def _build_shortlist_index(students):
+    index = {}
+    for s in students:
+        _add_shortlists(index, s)
+    return index
+
+
+def _add_applications(index, student):
+    # index: company name -> sorted student ids
+    student_id = student_key(student)
+    if not student_id:
+        return
+    for company_name in student.get("applications") or ():
+        ids = index.setdefault(company_name, [])
+        i = bisect_left(ids, student_id)
+        if i == len(ids) or ids[i] != student_id:
+            ids.insert(i, student_id)
+
+
+def _build_application_index(students):
+    index = {}
+    for s in students:
+        _add_applications(index, s)
+    return index
+
+
+def student_index():
+    return _index("students", load_students(), _build_student_index)
+
+
+def search_students(query) -> List[Student]:
+    # Ranked matches on name, student_id, email and branch. On SQLite the
+    # full-text index narrows it down to a few candidates, ranked the same way
+    if use_sqlite() and query.strip():
+        found = sqlite_store.search_students(query.strip().lower())
+        if found is not None:
+            return search_index.search(search_index.build(to_students(found)), query)
+    students = load_students()
+    return search_index.search(_index("search", students, search_index.build, _students_version()), query)
+
+
+def shortlist_index():
+    students = load_students()
+    return _index("shortlists", students, _build_shortlist_index, _students_version())
+
+
+def application_index():
+    students = load_students()
+    return _index("applications", students, _build_application_index, _students_version())
+
+
+def company_index():
+    return _index("companies", load_companies(), _build_company_index)
+
+
+def _patch_indexes(student):
+    # After a single-student write. Shortlists and applications are only ever
+    # added, so patching in the student's entries is enough; search entries are
+    # verified on lookup
+    entry = _indexes.get("shortlists")
+    if entry is not None:
+        _add_shortlists(entry[2], student)
+    entry = _indexes.get("applications")
+    if entry is not None:
+        _add_applications(entry[2], student)
+    entry = _indexes.get("search")
+    if entry is not None:
+        search_index.update(entry[2], student)
+
+
+def _reindex_student(student, old_email=None):
+    entry = _indexes.get("students")
+    if entry is None:
+        return
+    index = entry[2]
+    for key in (student.get("student_id"), student.get("id")):
+        if key:
+            index["by_id"].setdefault(key, student)
+    email = student.get("email")
+    if old_email and old_email != email and index["by_email"].get(old_email) is student:
+        del index["by_email"][old_email]
+    if email:
+        index["by_email"].setdefault(email, student)
+
+
+# --------- Students ---------
+def load_students() -> List[Student]:
+    if use_sqlite():
+        return _sqlite_cached("students", sqlite_store.load_students, to_students)
+    if use_log():
+        return student_log.load_students()
+    if use_sharded():
+        return student_shards.load_students()
+    return data_utils.load_data(STUDENTS_FILE, to_students)
+
+
+def get_student(student_id) -> Optional[Student]:
+    if use_sqlite():
+        return _record(Student, sqlite_store.get_student(student_id))
+    if use_log():
+        return student_log.get_student(student_id)
+    if use_sharded():
+        return student_shards.get_student(student_id)
+    return student_index()["by_id"].get(student_id)
+
+
+def get_student_by_email(email) -> Optional[Student]:
+    if use_sqlite():
+        return _record(Student, sqlite_store.get_student_by_email(email))
+    if use_log():
+        return student_log.get_student_by_email(email)
+    if use_sharded():
+        return student_shards.get_student_by_email(email)
+    return student_index()["by_email"].get(email)
+
+
+def add_student(student: Student) -> bool:
+    if get_student(student["student_id"]) or get_student_by_email(student["email"]):
+        return False
+    student = Student.from_dict(student)
+    with _transaction():
+        if use_sqlite():
+            added = sqlite_store.insert_student(student.to_dict())
+            _sqlite_changed()
+        elif use_log():
+            student_log.append("add", student["student_id"], record=student.to_dict())
+            # The indexes hold the replayed record, not this copy
+            student = student_log.get_student(student["student_id"])
+            added = student is not None
+        elif use_sharded():
+            student_shards.add_student(student)
+            _reindex_student(student)
+            added = True
+        else:
+            students = load_students()
+            students.append(student)
+            data_utils.save_data(STUDENTS_FILE, students, to_students)
+            _reindex_student(student)
+            added = True
+        if added:
+            _update_counters(Counter(), _contribution(student))
+    if added:
+        _patch_indexes(student)
+    return added
+
+
+def _update_json_student(student_id, change, entry):
+    # change(student) returns False when there is nothing to write,
+    # in log mode the (op, fields) entry is appended instead
+    if use_log():
+        if student_log.get_student(student_id) is None:
+            return None
+        op, fields = entry
+        student_log.append(op, student_id, **fields)
+        return student_log.get_student(student_id)
+
+    if use_sharded():
+        s = student_shards.get_student(student_id)
+    else:
+        students = load_students()
+        s = student_index()["by_id"].get(student_id)
+    if s is None:
+        return None
+    old_email = s.get("email")
+    if change(s) is False:
+        return None
+    if use_sharded():
+        # Only this student's file is rewritten
+        student_shards.save_student(s)
+    else:
+        data_utils.save_data(STUDENTS_FILE, students, to_students)
+    _reindex_student(s, old_email)
+    return s
+
+
+def _counted(student_id, write):
+    # Keeps the placement counters in step with a single-student write
+    with _transaction():
+        before = _contribution(get_student(student_id))
+        student = write()
+        if student is not None:
+            _update_counters(before, _contribution(student))
+    if student is not None:
+        _patch_indexes(student)
+    return student
+
+
+def update_student(student_id, fields) -> Optional[Student]:
+    return _counted(student_id, lambda: _update_student(student_id, fields))
+
+
+def _update_student(student_id, fields):
+    if use_sqlite():
+        student = sqlite_store.update_student(student_id, fields)
+        _sqlite_changed()
+        return _record(Student, student)
+    return _update_json_student(student_id, lambda s: s.update(fields), ("update", {"fields": fields}))
+
+
+def add_application(student_id, company_name) -> Optional[Student]:
+    # Returns the updated student, or None if not found / already applied
+    return _counted(student_id, lambda: _add_application(student_id, company_name))
+
+
+def _add_application(student_id, company_name):
+    if use_sqlite():
+        student = sqlite_store.add_application(student_id, company_name)
+        _sqlite_changed()
+        return _record(Student, student)
+    if use_log():
+        s = student_log.get_student(student_id)
+        if s is not None and company_name in s.get("applications", []):
+            return None
+
+    def change(s):
+        applications = s.setdefault("applications", [])
+        if company_name in applications:
+            return False
+        applications.append(company_name)
+
+    return _update_json_student(student_id, change, ("apply", {"company": company_name}))
+
+
+def set_shortlist(student_id, job_id, round_name, selected=False) -> Optional[Student]:
+    return _counted(student_id, lambda: _set_shortlist(student_id, job_id, round_name, selected))
+
+
+def _set_shortlist(student_id, job_id, round_name, selected):
+    if use_sqlite():
+        student = sqlite_store.set_shortlist(student_id, job_id, round_name, selected=selected)
+        _sqlite_changed()
+        return _record(Student, student)
+
+    op = "select" if selected else "shortlist"
+    change = _shortlist_change(job_id, round_name, selected)
+    return _update_json_student(student_id, change, (op, {"job_id": job_id, "round": round_name}))
+
+
+def _shortlist_change(job_id, round_name, selected):
+    def change(s):
+        if selected:
+            s.setdefault("selected", [])
+            if job_id not in s["selected"]:
+                s["selected"].append(job_id)
+        s.setdefault("shortlists", {}).setdefault(job_id, {})[round_name] = True
+    return change
+
+
+def bulk_shortlist(student_ids, job_id, round_name, selected=False):
+    # Shortlists (or selects) every known id with a single write.
+    # Returns (updated students, ids that matched no student)
+    student_ids = list(dict.fromkeys(student_ids))
+    with _transaction():
+        if use_sqlite():
+            before = Counter()
+            for s in sqlite_store.get_students(student_ids):
+                before.update(_contribution(s))
+            matched = [Student.from_dict(s) for s in sqlite_store.bulk_set_shortlist(student_ids, job_id,
+                                                                                      round_name, selected)]
+            _sqlite_changed()
+        else:
+            matched = [s for s in map(get_student, student_ids) if s is not None]
+            before = Counter()
+            for s in matched:
+                before.update(_contribution(s))
+            op = "select" if selected else "shortlist"
+            if use_log():
+                student_log.append_many([(op, student_key(s), {"job_id": job_id, "round": round_name})
+                                         for s in matched])
+                matched = [student_log.get_student(student_key(s)) for s in matched]
+            else:
+                change = _shortlist_change(job_id, round_name, selected)
+                for s in matched:
+                    change(s)
+                if use_sharded():
+                    # One small file per student, nothing else is rewritten
+                    for s in matched:
+                        student_shards.save_student(s)
+                elif matched:
+                    data_utils.save_data(STUDENTS_FILE, load_students(), to_students)
+        after = Counter()
+        for s in matched:
+            after.update(_contribution(s))
+        _update_counters(before, after)
+
+    found = {student_key(s) for s in matched}
+    if matched:
+        for s in matched:
+            _patch_indexes(s)
+    return matched, [i for i in student_ids if i not in found]
+
+
+def mark_selected(student_id, job_id, round_name) -> Optional[Student]:
+    return set_shortlist(student_id, job_id, round_name, selected=True)
+
+
+def shortlisted(job_id, round_name) -> List[Student]:
+    # Students shortlisted for a round, by student id; O(k) for k students
+    if use_sqlite():
+        return [Student.from_dict(s) for s in sqlite_store.get_shortlisted(job_id, round_name)]
+    ids = shortlist_index().get(job_id, {}).get(round_name, ())
+    return [s for s in map(get_student, ids) if s is not None]
+
+
+def notification_recipients(job_id, applied=True, shortlisted=True) -> List[Student]:
+    # Students who applied to the job's company and/or are shortlisted for any
+    # of its rounds, by student id. Applications only record the company name.
+    company = get_company_by_job_id(job_id)
+    company_name = company["name"] if company is not None else None
+    if use_sqlite():
+        return [Student.from_dict(s) for s in sqlite_store.get_recipients(
+            company_name if applied else None, job_id if shortlisted else None)]
+    ids = set()
+    if applied and company_name is not None:
+        ids.update(application_index().get(company_name, ()))
+    if shortlisted:
+        for round_ids in shortlist_index().get(job_id, {}).values():
+            ids.update(round_ids)
+    return [s for s in map(get_student, sorted(ids)) if s is not None]
+
+
+# --------- Companies ---------
+def drive_year(company):
+    drive_date = company.get("date_of_drive")
+    if isinstance(drive_date, date):
+        return drive_date.year
+    return date.fromisoformat(drive_date).year
+
+
+def load_companies() -> List[Company]:
+    try:
+        if use_sqlite():
+            return _sqlite_cached("companies", sqlite_store.load_companies, to_companies)
+        return data_utils.load_data(COMPANIES_FILE, to_companies)
+    except json.JSONDecodeError:
+        return []
+
+
+def save_companies(companies: List[Company]):
+    _indexes.pop("companies", None)
+    companies = to_companies(companies)
+    with _transaction():
+        if use_sqlite():
+            sqlite_store.save_companies(to_plain(companies))
+            _sqlite_changed()
+        else:
+            data_utils.save_data(COMPANIES_FILE, companies, to_companies)
+        # Company names and drive dates feed the counters
+        _refresh_counters()
+
+
+def get_company_by_name(name) -> Optional[Company]:
+    if use_sqlite():
+        return _record(Company, sqlite_store.get_company_by_name(name))
+    return company_index()["by_name"].get(name)
+
+
+def get_company_by_job_id(job_id) -> Optional[Company]:
+    if use_sqlite():
+        return _record(Company, sqlite_store.get_company_by_job_id(job_id))
+    return company_index()["by_job_id"].get(job_id)
+
+
+# --------- Placement counters ---------
+def _contribution(student):
+    return counters.contribution(student, company_index())
+
+
+def compute_counters():
+    # Linear in students: every company lookup is a dict hit on the shared index
+    return counters.compute(load_students(), company_index())
+
+
+def counters_version():
+    # Changes with the counters or the companies, whichever process wrote them;
+    # the Placement Analytics results are cached under it (see analytics.py)
+    if use_sqlite():
+        return data_utils.file_signature(sqlite_store.DB_FILE, sqlite_store.DB_FILE + "-wal")
+    return data_utils.file_signature(counters.COUNTERS_FILE, COMPANIES_FILE)
+
+
+def stored_counters():
+    # The materialized counters, None until built
+    if use_sqlite():
+        rows = sqlite_store.load_counters()
+        return counters.from_rows(rows) if rows else None
+    return counters.load()
+
+
+def _save_counters(stored):
+    if use_sqlite():
+        sqlite_store.save_counters(counters.to_rows(stored))
+    else:
+        counters.save(stored)
+
+
+def _update_counters(before, after):
+    if use_sqlite():
+        sqlite_store.add_counters(counters.delta_rows(before, after))
+    else:
+        counters.update(before, after)
+
+
+def placement_counters():
+    # O(1) read of the materialized counters, built on first use
+    stored = stored_counters()
+    if stored is None:
+        stored = rebuild_counters()
+    return stored
+
+
+def rebuild_counters():
+    with _transaction():
+        live = compute_counters()
+        _save_counters(live)
+    return live
+
+
+def _refresh_counters():
+    # Bulk saves rebuild the counters rather than diffing every record
+    if stored_counters() is not None:
+        rebuild_counters()
+
+
+# --------- Notifications / Queries / Responses ---------
+LOG_FILES = {
+    "notifications": NOTIFICATIONS_FILE,
+    "queries": QUERIES_FILE,
+    "responses": RESPONSES_FILE,
+}
+LOG_PARSERS = {
+    "notifications": to_notifications,
+    "queries": to_queries,
+    "responses": None,
+}
+
+
+def _log_file(table):
+    # One-time conversion of an older JSON array file (notifications.json etc.)
+    filename = LOG_FILES[table]
+    legacy = filename[:-1]
+    if not os.path.exists(filename) and os.path.exists(legacy):
+        data_utils.convert_to_lines(legacy, filename)
+    return filename
+
+
+def iter_log(table, where=None, newest_first=False, limit=None):
+    # Yields (record_id, record) without loading the whole history,
+    # record_id is stable so it can key widgets
+    parse = LOG_PARSERS[table]
+    if use_sqlite():
+        records = sqlite_store.iter_records(table, where, newest_first, limit)
+    else:
+        records = data_utils.iter_lines(_log_file(table), where, newest_first, limit)
+    for record_id, record in records:
+        yield record_id, parse([record])[0] if parse else record
+
+
+def latest(table, limit, **where):
+    return list(iter_log(table, where, newest_first=True, limit=limit))
+
+
+def _add_to_log(table, record):
+    if use_sqlite():
+        sqlite_store.add_record(table, to_plain([record])[0])
+        _sqlite_changed()
+    else:
+        data_utils.append_line(_log_file(table), record)
+
+
+def add_notification(notification: Notification):
+    _add_to_log("notifications", notification)
+
+
+def add_query(query: Query):
+    _add_to_log("queries", query)
+
+
+def load_responses_for(student_id, limit=None) -> List[ResponseRecord]:
+    # Newest first
+    return [r for _, r in latest("responses", limit, student_id=student_id)]
+
+
+def add_response(response: ResponseRecord):
+    _add_to_log("responses", response)
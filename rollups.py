@@ -0,0 +1,126 @@
+import argparse
+import os
+import statistics
+from collections import Counter
+from datetime import date, datetime
+
+import data_utils
+import repository
+from counters import placements
+
+# Aggregated placement history in ROLLUPS_FILE, one small entry per academic
+# year and per drive:
+#   years:  "2024-25" -> placed, selections, drives, median/max package, branches
+#   drives: job_id    -> name, role, academic_year, date_of_drive, package, placed, branches
+# Past academic years are frozen once stored: a snapshot adds missing years and
+# refreshes the current one, so history stays after a graduated batch is
+# removed from students.json. Naming years explicitly refreshes those instead.
+ROLLUPS_FILE = os.getenv("PLACEMENT_ROLLUPS_FILE", "rollups.json")
+# Academic years run from this month to the month before it, e.g. July 2024 - June 2025
+ACADEMIC_YEAR_START = int(os.getenv("ACADEMIC_YEAR_START_MONTH", "7"))
+
+
+def academic_year(drive_date):
+    if not isinstance(drive_date, date):
+        drive_date = date.fromisoformat(drive_date)
+    start = drive_date.year if drive_date.month >= ACADEMIC_YEAR_START else drive_date.year - 1
+    return f"{start}-{(start + 1) % 100:02d}"
+
+
+def _package(company):
+    try:
+        return float(company.get("package"))
+    except (TypeError, ValueError):
+        return None
+
+
+def compute(students, companies, company_list):
+    # companies is repository.company_index(), company_list the companies themselves
+    drives = {}
+    for c in company_list:
+        try:
+            year = academic_year(c.get("date_of_drive"))
+        except (TypeError, ValueError):
+            continue
+        if c.get("job_id"):
+            drives[c["job_id"]] = {"name": c.get("name"), "role": c.get("role"), "academic_year": year,
+                                   "date_of_drive": str(c.get("date_of_drive")), "package": _package(c),
+                                   "placed": 0, "branches": Counter()}
+
+    years = {}
+    for d in drives.values():
+        y = years.setdefault(d["academic_year"], {"placed": 0, "selections": 0, "drives": 0,
+                                                  "packages": [], "branches": Counter()})
+        y["drives"] += 1
+
+    for s in students:
+        branch = s.get("branch") or "Unknown"
+        counted = set()
+        for _, _, company in placements(s, companies):
+            drive = drives.get(company.get("job_id")) if company is not None else None
+            if drive is None:
+                continue
+            drive["placed"] += 1
+            drive["branches"][branch] += 1
+            y = years[drive["academic_year"]]
+            y["selections"] += 1
+            if drive["package"] is not None:
+                y["packages"].append(drive["package"])
+            if drive["academic_year"] not in counted:
+                # A student placed twice in a year counts once in placed/branches
+                counted.add(drive["academic_year"])
+                y["placed"] += 1
+                y["branches"][branch] += 1
+
+    for y in years.values():
+        packages = y.pop("packages")
+        y["median_package"] = statistics.median(packages) if packages else None
+        y["max_package"] = max(packages) if packages else None
+        y["branches"] = dict(y["branches"])
+    for d in drives.values():
+        d["branches"] = dict(d["branches"])
+    return {"years": years, "drives": drives}
+
+
+# --------- Store ---------
+def load():
+    stored = data_utils.load_data(ROLLUPS_FILE)
+    return stored or {"years": {}, "drives": {}}
+
+
+def snapshot(academic_years=None):
+    # Folds the live data into the store
+    live = compute(repository.load_students(), repository.company_index(), repository.load_companies())
+    stored = load()
+    stamp = datetime.now().isoformat(timespec="seconds")
+    years = dict(stored["years"])
+    drives = dict(stored["drives"])
+
+    def refresh(year):
+        if academic_years is not None:
+            return year in academic_years
+        return year not in years or year == academic_year(date.today())
+
+    refreshed = {year for year in live["years"] if refresh(year)}
+    for year in refreshed:
+        years[year] = dict(live["years"][year], snapshot_at=stamp)
+    for job_id, values in live["drives"].items():
+        if values["academic_year"] in refreshed:
+            drives[job_id] = dict(values, snapshot_at=stamp)
+    rollups = {"years": dict(sorted(years.items())), "drives": drives}
+    data_utils.save_data(ROLLUPS_FILE, rollups)
+    return rollups
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per academic year / per drive placement roll-ups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    snap = sub.add_parser("snapshot", help="Store roll-ups computed from the live data")
+    snap.add_argument("--year", action="append", help="Only this academic year, e.g. 2024-25 (repeatable)")
+    sub.add_parser("show", help="Print the stored per-year roll-ups")
+    args = parser.parse_args()
+
+    rollups = snapshot(args.year) if args.command == "snapshot" else load()
+    for year, y in rollups["years"].items():
+        print(f"{year}: {y['placed']} placed, {y['selections']} selections, {y['drives']} drives, "
+              f"median package {y['median_package']}, max {y['max_package']}")
@@ -0,0 +1,108 @@
+import re
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+
+# Admin student search over name, student_id, email and branch.
+#   prefixes: sorted (token, position) pairs; a bisect gives every token
+#             starting with the query, like walking a prefix trie
+#   trigrams: trigram -> positions containing it, for substring and fuzzy matches;
+#             queries under three characters scan the texts instead
+# Positions index into the students list the index was built from. Candidates
+# are always checked against the live text, so an entry left behind by an
+# edit can't produce a wrong match.
+SEPARATOR = "\x00"
+FUZZY_SHARE = 0.6  # share of the query's trigrams a fuzzy match needs
+
+
+def _text(student):
+    # Fields joined and wrapped in SEPARATOR, so whole fields can be matched too
+    values = (student.get("name"), student.get("student_id"), student.get("email"), student.get("branch"))
+    return SEPARATOR + SEPARATOR.join(str(v).lower() for v in values if v) + SEPARATOR
+
+
+def _tokens(text):
+    tokens = set(text.split(SEPARATOR))
+    tokens.update(re.split(r"[\s@._\-\x00]+", text))
+    tokens.discard("")
+    return tokens
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2) if SEPARATOR not in text[i:i + 3]}
+
+
+def build(students):
+    texts = [_text(s) for s in students]
+    prefixes = []
+    postings = {}
+    for position, text in enumerate(texts):
+        prefixes.extend((token, position) for token in _tokens(text))
+        for trigram in _trigrams(text):
+            postings.setdefault(trigram, []).append(position)
+    prefixes.sort()
+    return {"students": students, "texts": texts, "prefixes": prefixes,
+            "trigrams": {t: array("i", p) for t, p in postings.items()},
+            "positions": {id(s): p for p, s in enumerate(students)}}
+
+
+def update(index, student):
+    # Adds a new or changed student; the old text's entries are just left behind
+    students = index["students"]
+    position = index["positions"].get(id(student))
+    if position is None or students[position] is not student:
+        if not students or students[-1] is not student:
+            return  # not in this version of the list, the next build picks it up
+        position = len(students) - 1
+        index["positions"][id(student)] = position
+    text = _text(student)
+    if position < len(index["texts"]):
+        index["texts"][position] = text
+    else:
+        index["texts"].append(text)
+    for token in _tokens(text):
+        insort(index["prefixes"], (token, position))
+    for trigram in _trigrams(text):
+        positions = index["trigrams"].setdefault(trigram, array("i"))
+        i = bisect_left(positions, position)
+        if i == len(positions) or positions[i] != position:
+            positions.insert(i, position)
+
+
+def search(index, query):
+    # Matching students, best first: exact field, then word prefix, then
+    # substring; a query with no such match falls back to shared trigrams
+    query = query.strip().lower()
+    students = index["students"]
+    if not query:
+        return list(students)
+
+    texts = index["texts"]
+    prefixed = set()
+    prefixes = index["prefixes"]
+    i = bisect_left(prefixes, (query,))
+    while i < len(prefixes) and prefixes[i][0].startswith(query):
+        prefixed.add(prefixes[i][1])
+        i += 1
+    trigrams = _trigrams(query)
+    postings = [index["trigrams"].get(t, ()) for t in trigrams]
+    if postings:
+        candidates = prefixed.union(min(postings, key=len))
+    else:
+        # Too short for a trigram: every text is scanned for the substring
+        candidates = range(len(texts))
+
+    whole = SEPARATOR + query + SEPARATOR
+    matches = []
+    for p in candidates:
+        text = texts[p]
+        if query in text:
+            matches.append((0 if whole in text else 1 if p in prefixed else 2, p))
+    if not matches and len(trigrams) >= 2:
+        shared = Counter()
+        for positions in postings:
+            shared.update(positions)
+        needed = max(2, int(len(trigrams) * FUZZY_SHARE + 0.5))
+        matches = [(3 + len(trigrams) - n, p) for p, n in shared.items() if n >= needed]
+    matches.sort()
+    return [students[p] for _, p in matches]
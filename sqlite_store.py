@@ -0,0 +1,573 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import data_utils
+
+DB_FILE = os.getenv("PLACEMENT_DB", "placement.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    student_id TEXT PRIMARY KEY,
+    name TEXT,
+    email TEXT,
+    password TEXT,
+    cgpa TEXT,
+    branch TEXT,
+    placed INTEGER DEFAULT 0,
+    profile_pic TEXT,
+    resume TEXT,
+    selected_company TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_students_email ON students(email);
+
+CREATE TABLE IF NOT EXISTS companies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT,
+    name TEXT,
+    role TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_companies_job_id ON companies(job_id);
+CREATE INDEX IF NOT EXISTS idx_companies_name ON companies(name);
+
+CREATE TABLE IF NOT EXISTS applications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    company_name TEXT NOT NULL,
+    UNIQUE (student_id, company_name)
+);
+CREATE INDEX IF NOT EXISTS idx_applications_company ON applications(company_name);
+
+CREATE TABLE IF NOT EXISTS shortlists (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    round TEXT NOT NULL,
+    UNIQUE (student_id, job_id, round)
+);
+CREATE INDEX IF NOT EXISTS idx_shortlists_job_id ON shortlists(job_id, round);
+
+CREATE TABLE IF NOT EXISTS selections (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    UNIQUE (student_id, job_id)
+);
+CREATE INDEX IF NOT EXISTS idx_selections_job_id ON selections(job_id);
+
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_notifications_job_id ON notifications(job_id);
+
+CREATE TABLE IF NOT EXISTS queries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_queries_student_id ON queries(student_id);
+
+CREATE TABLE IF NOT EXISTS responses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_responses_student_id ON responses(student_id);
+
+CREATE TABLE IF NOT EXISTS counters (
+    section TEXT NOT NULL,
+    key TEXT NOT NULL,
+    round TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (section, key, round)
+);
+"""
+
+# Student search: a trigram full-text index over the searched columns, kept in
+# step with the students table by triggers. Needs SQLite 3.34+ built with FTS5;
+# without it search_students returns None.
+SEARCH_COLUMNS = "name, student_id, email, branch"
+SEARCH_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(
+    {SEARCH_COLUMNS}, content='students', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS students_fts_insert AFTER INSERT ON students BEGIN
+    INSERT INTO students_fts (rowid, {SEARCH_COLUMNS})
+    VALUES (new.rowid, new.name, new.student_id, new.email, new.branch);
+END;
+CREATE TRIGGER IF NOT EXISTS students_fts_delete AFTER DELETE ON students BEGIN
+    INSERT INTO students_fts (students_fts, rowid, {SEARCH_COLUMNS})
+    VALUES ('delete', old.rowid, old.name, old.student_id, old.email, old.branch);
+END;
+CREATE TRIGGER IF NOT EXISTS students_fts_update AFTER UPDATE ON students BEGIN
+    INSERT INTO students_fts (students_fts, rowid, {SEARCH_COLUMNS})
+    VALUES ('delete', old.rowid, old.name, old.student_id, old.email, old.branch);
+    INSERT INTO students_fts (rowid, {SEARCH_COLUMNS})
+    VALUES (new.rowid, new.name, new.student_id, new.email, new.branch);
+END;
+"""
+
+# Columns stored directly on the students table, everything else goes to "extra"
+STUDENT_COLUMNS = ["name", "student_id", "email", "password", "cgpa", "branch",
+                   "placed", "profile_pic", "resume", "selected_company"]
+STUDENT_LISTS = ["applications", "shortlists", "selected"]
+
+_local = threading.local()
+
+
+def get_connection(db_path=None):
+    # sqlite3 connections can't be shared across threads, Streamlit runs each session in its own thread
+    db_path = db_path or DB_FILE
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _create_search(conn)
+        conns[db_path] = conn
+    return conn
+
+
+@contextmanager
+def transaction(db_path=None):
+    # One write transaction; the student writes below join an enclosing one,
+    # so a caller can put several of them and the counters in a single commit
+    conn = get_connection(db_path)
+    if conn.in_transaction:
+        yield conn
+        return
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        yield conn
+
+
+def _has_search(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'students_fts'").fetchone() is not None
+
+
+def _create_search(conn):
+    if sqlite3.sqlite_version_info < (3, 34, 0) or _has_search(conn):
+        return
+    try:
+        with conn:
+            conn.executescript(SEARCH_SCHEMA)
+            # Students already in the database before the index existed
+            conn.execute("INSERT INTO students_fts (students_fts) VALUES ('rebuild')")
+    except sqlite3.OperationalError:
+        pass  # no FTS5 in this build
+
+
+# --------- Row helpers ---------
+def _student_row(student):
+    student_id = student.get("student_id") or student.get("id")
+    extra = {k: v for k, v in student.items()
+             if k not in STUDENT_COLUMNS and k not in STUDENT_LISTS}
+    return (
+        student_id,
+        student.get("name"),
+        student.get("email"),
+        student.get("password"),
+        student.get("cgpa"),
+        student.get("branch"),
+        1 if student.get("placed") else 0,
+        student.get("profile_pic"),
+        student.get("resume", ""),
+        student.get("selected_company"),
+        json.dumps(extra) if extra else None,
+    )
+
+
+def _insert_student(conn, student):
+    row = _student_row(student)
+    student_id = row[0]
+    conn.execute(
+        "INSERT INTO students (student_id, name, email, password, cgpa, branch, placed, "
+        "profile_pic, resume, selected_company, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        row,
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO applications (student_id, company_name) VALUES (?, ?)",
+        [(student_id, c) for c in student.get("applications", [])],
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO shortlists (student_id, job_id, round) VALUES (?, ?, ?)",
+        [(student_id, job_id, r)
+         for job_id, rounds in student.get("shortlists", {}).items()
+         for r, status in rounds.items() if status],
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO selections (student_id, job_id) VALUES (?, ?)",
+        [(student_id, job_id) for job_id in student.get("selected", [])],
+    )
+
+
+def _row_to_student(row):
+    student = {
+        "name": row["name"],
+        "student_id": row["student_id"],
+        "email": row["email"],
+        "password": row["password"],
+        "cgpa": row["cgpa"],
+        "branch": row["branch"],
+        "applications": [],
+        "placed": bool(row["placed"]),
+        "profile_pic": row["profile_pic"],
+        "resume": row["resume"] or "",
+    }
+    if row["selected_company"]:
+        student["selected_company"] = row["selected_company"]
+    if row["extra"]:
+        student.update(json.loads(row["extra"]))
+    return student
+
+
+def _attach_lists(conn, students_by_id, where="", params=()):
+    for row in conn.execute(f"SELECT student_id, company_name FROM applications {where} ORDER BY id", params):
+        s = students_by_id.get(row["student_id"])
+        if s is not None:
+            s["applications"].append(row["company_name"])
+    for row in conn.execute(f"SELECT student_id, job_id, round FROM shortlists {where} ORDER BY id", params):
+        s = students_by_id.get(row["student_id"])
+        if s is not None:
+            s.setdefault("shortlists", {}).setdefault(row["job_id"], {})[row["round"]] = True
+    for row in conn.execute(f"SELECT student_id, job_id FROM selections {where} ORDER BY id", params):
+        s = students_by_id.get(row["student_id"])
+        if s is not None:
+            s.setdefault("selected", []).append(row["job_id"])
+
+
+# --------- Students ---------
+def load_students(db_path=None):
+    conn = get_connection(db_path)
+    students = [_row_to_student(r) for r in conn.execute("SELECT * FROM students ORDER BY rowid")]
+    _attach_lists(conn, {s["student_id"]: s for s in students})
+    return students
+
+
+def _fetch_student(conn, where, value):
+    row = conn.execute(f"SELECT * FROM students WHERE {where} = ? LIMIT 1", (value,)).fetchone()
+    if row is None:
+        return None
+    student = _row_to_student(row)
+    _attach_lists(conn, {student["student_id"]: student}, "WHERE student_id = ?", (student["student_id"],))
+    return student
+
+
+def get_student(student_id, db_path=None):
+    return _fetch_student(get_connection(db_path), "student_id", student_id)
+
+
+def get_student_by_email(email, db_path=None):
+    return _fetch_student(get_connection(db_path), "email", email)
+
+
+def _with_lists(conn, rows):
+    students = [_row_to_student(r) for r in rows]
+    if students:
+        by_id = {s["student_id"]: s for s in students}
+        marks = ", ".join("?" * len(by_id))
+        _attach_lists(conn, by_id, f"WHERE student_id IN ({marks})", list(by_id))
+    return students
+
+
+def get_shortlisted(job_id, round_name, db_path=None):
+    # Students shortlisted for one round, by student_id, via idx_shortlists_job_id
+    conn = get_connection(db_path)
+    rows = conn.execute("SELECT s.* FROM shortlists sl JOIN students s ON s.student_id = sl.student_id "
+                        "WHERE sl.job_id = ? AND sl.round = ? ORDER BY s.student_id", (job_id, round_name))
+    return _with_lists(conn, rows)
+
+
+def get_recipients(company_name=None, job_id=None, db_path=None):
+    # Students who applied to company_name or are shortlisted for any round of job_id
+    conn = get_connection(db_path)
+    rows = conn.execute("SELECT s.* FROM students s WHERE s.student_id IN "
+                        "(SELECT student_id FROM applications WHERE company_name = ? "
+                        "UNION SELECT student_id FROM shortlists WHERE job_id = ?) ORDER BY s.student_id",
+                        (company_name, job_id))
+    return _with_lists(conn, rows)
+
+
+def _search_matches(conn, phrases):
+    match = " OR ".join('"' + p.replace('"', '""') + '"' for p in phrases)
+    return conn.execute("SELECT s.* FROM students_fts JOIN students s ON s.rowid = students_fts.rowid "
+                        "WHERE students_fts MATCH ? ORDER BY s.rowid", (match,)).fetchall()
+
+
+def search_students(query, db_path=None):
+    # Students whose name, student_id, email or branch contains query, in
+    # insertion order; with none, those sharing a trigram with it (the caller
+    # ranks and filters). Queries under three characters have no trigrams and
+    # are matched with LIKE.
+    conn = get_connection(db_path)
+    if not _has_search(conn):
+        return None
+    if len(query) < 3:
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        where = " OR ".join(f"{c} LIKE ?1 ESCAPE '\\'" for c in SEARCH_COLUMNS.split(", "))
+        rows = conn.execute(f"SELECT * FROM students WHERE {where} ORDER BY rowid", (pattern,)).fetchall()
+    else:
+        rows = _search_matches(conn, [query])
+        trigrams = {query[i:i + 3] for i in range(len(query) - 2)}
+        if not rows and len(trigrams) > 1:
+            rows = _search_matches(conn, sorted(trigrams))
+    students = []
+    for i in range(0, len(rows), 500):
+        students.extend(_with_lists(conn, rows[i:i + 500]))
+    return students
+
+
+def get_students(student_ids, db_path=None):
+    # Existing students among student_ids, in that order
+    conn = get_connection(db_path)
+    found = {}
+    student_ids = list(student_ids)
+    for i in range(0, len(student_ids), 500):
+        chunk = student_ids[i:i + 500]
+        marks = ", ".join("?" * len(chunk))
+        for s in _with_lists(conn, conn.execute(f"SELECT * FROM students WHERE student_id IN ({marks})", chunk)):
+            found[s["student_id"]] = s
+    return [found[i] for i in student_ids if i in found]
+
+
+def bulk_set_shortlist(student_ids, job_id, round_name, selected=False, db_path=None):
+    # One transaction for the whole list; ids that don't exist are skipped
+    with transaction(db_path) as conn:
+        existing = [s["student_id"] for s in get_students(student_ids, db_path)]
+        if selected:
+            conn.executemany("INSERT OR IGNORE INTO selections (student_id, job_id) VALUES (?, ?)",
+                             [(i, job_id) for i in existing])
+        conn.executemany("INSERT OR IGNORE INTO shortlists (student_id, job_id, round) VALUES (?, ?, ?)",
+                         [(i, job_id, round_name) for i in existing])
+    return get_students(existing, db_path)
+
+
+def insert_student(student, db_path=None):
+    try:
+        with transaction(db_path) as conn:
+            _insert_student(conn, student)
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+
+def update_student(student_id, fields, db_path=None):
+    columns = {k: v for k, v in fields.items() if k in STUDENT_COLUMNS and k != "student_id"}
+    other = {k: v for k, v in fields.items() if k not in STUDENT_COLUMNS and k not in STUDENT_LISTS}
+    with transaction(db_path) as conn:
+        if columns:
+            assignments = ", ".join(f"{k} = ?" for k in columns)
+            cur = conn.execute(f"UPDATE students SET {assignments} WHERE student_id = ?",
+                               [1 if v is True else 0 if v is False else v for v in columns.values()] + [student_id])
+            if cur.rowcount == 0:
+                return None
+        if other:
+            row = conn.execute("SELECT extra FROM students WHERE student_id = ?", (student_id,)).fetchone()
+            if row is None:
+                return None
+            extra = json.loads(row["extra"]) if row["extra"] else {}
+            extra.update(other)
+            conn.execute("UPDATE students SET extra = ? WHERE student_id = ?", (json.dumps(extra), student_id))
+    return get_student(student_id, db_path)
+
+
+def add_application(student_id, company_name, db_path=None):
+    with transaction(db_path) as conn:
+        if conn.execute("SELECT 1 FROM students WHERE student_id = ?", (student_id,)).fetchone() is None:
+            return None
+        cur = conn.execute("INSERT OR IGNORE INTO applications (student_id, company_name) VALUES (?, ?)",
+                           (student_id, company_name))
+        if cur.rowcount == 0:
+            return None
+    return get_student(student_id, db_path)
+
+
+def set_shortlist(student_id, job_id, round_name, selected=False, db_path=None):
+    with transaction(db_path) as conn:
+        if conn.execute("SELECT 1 FROM students WHERE student_id = ?", (student_id,)).fetchone() is None:
+            return None
+        if selected:
+            conn.execute("INSERT OR IGNORE INTO selections (student_id, job_id) VALUES (?, ?)",
+                         (student_id, job_id))
+        conn.execute("INSERT OR IGNORE INTO shortlists (student_id, job_id, round) VALUES (?, ?, ?)",
+                     (student_id, job_id, round_name))
+    return get_student(student_id, db_path)
+
+
+# --------- Counters ---------
+# Rows of the placement counters, see counters.to_rows
+def load_counters(db_path=None):
+    # None until the first rebuild
+    rows = get_connection(db_path).execute("SELECT section, key, round, n FROM counters ORDER BY rowid").fetchall()
+    return [tuple(row) for row in rows] or None
+
+
+def save_counters(rows, db_path=None):
+    with transaction(db_path) as conn:
+        conn.execute("DELETE FROM counters")
+        conn.executemany("INSERT INTO counters (section, key, round, n) VALUES (?, ?, ?, ?)", rows)
+
+
+def add_counters(rows, db_path=None):
+    # Adds each row's n to its count, dropping counts that reach 0; no-op until built
+    if not rows:
+        return
+    with transaction(db_path) as conn:
+        if conn.execute("SELECT 1 FROM counters LIMIT 1").fetchone() is None:
+            return
+        conn.executemany("INSERT INTO counters (section, key, round, n) VALUES (?, ?, ?, ?) "
+                         "ON CONFLICT (section, key, round) DO UPDATE SET n = n + excluded.n", rows)
+        conn.execute("DELETE FROM counters WHERE n = 0 AND section != 'placed'")
+
+
+# --------- Companies ---------
+def load_companies(db_path=None):
+    conn = get_connection(db_path)
+    return [json.loads(r["data"]) for r in conn.execute("SELECT data FROM companies ORDER BY id")]
+
+
+def save_companies(companies, db_path=None):
+    with transaction(db_path) as conn:
+        conn.execute("DELETE FROM companies")
+        conn.executemany(
+            "INSERT INTO companies (job_id, name, role, data) VALUES (?, ?, ?, ?)",
+            [(c.get("job_id"), c.get("name"), c.get("role"), json.dumps(c, default=str)) for c in companies],
+        )
+
+
+def get_company_by_name(name, db_path=None):
+    row = get_connection(db_path).execute(
+        "SELECT data FROM companies WHERE name = ? ORDER BY id LIMIT 1", (name,)).fetchone()
+    return json.loads(row["data"]) if row else None
+
+
+def get_company_by_job_id(job_id, db_path=None):
+    row = get_connection(db_path).execute(
+        "SELECT data FROM companies WHERE job_id = ? ORDER BY id LIMIT 1", (job_id,)).fetchone()
+    return json.loads(row["data"]) if row else None
+
+
+# --------- Notifications / Queries / Responses ---------
+# These are append-only logs, the full record is kept as JSON next to the indexed key
+LOG_TABLES = {"notifications": "job_id", "queries": "student_id", "responses": "student_id"}
+
+
+def iter_records(table, where=None, newest_first=False, limit=None, db_path=None):
+    # Yields (id, record); a condition on the indexed key column is done in SQL
+    key = LOG_TABLES[table]
+    where = dict(where or {})
+    sql = f"SELECT id, data FROM {table}"
+    params = []
+    if key in where:
+        sql += f" WHERE {key} = ?"
+        params.append(where.pop(key))
+    sql += " ORDER BY id DESC" if newest_first else " ORDER BY id"
+    if limit is not None and not where:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    count = 0
+    for row in get_connection(db_path).execute(sql, params):
+        if limit is not None and count >= limit:
+            return
+        record = json.loads(row["data"])
+        if all(record.get(k) == v for k, v in where.items()):
+            count += 1
+            yield row["id"], record
+
+
+def add_record(table, record, db_path=None):
+    key = LOG_TABLES[table]
+    conn = get_connection(db_path)
+    with conn:
+        conn.execute(f"INSERT INTO {table} ({key}, data) VALUES (?, ?)", (record.get(key), json.dumps(record)))
+
+
+# --------- Migration ---------
+def _read_data_file(path):
+    if not os.path.exists(path):
+        return []
+    try:
+        return data_utils.read_file(path)
+    except ValueError:
+        print(f"Skipping {path}: not a valid data file")
+        return []
+
+
+def _read_log_file(path):
+    # notifications/queries/responses are line-delimited, older installs have a JSON array
+    if path.endswith(".jsonl"):
+        if os.path.exists(path):
+            return [r for _, r in data_utils.iter_lines(path)]
+        path = path[:-1]
+    return _read_data_file(path)
+
+
+def migrate_from_json(db_path=None, students_file="students.json", companies_file="companies.json",
+                      notifications_file="notifications.jsonl", queries_file="queries.jsonl",
+                      responses_file="responses.jsonl", overwrite=False):
+    conn = get_connection(db_path)
+    existing = conn.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+    if existing and not overwrite:
+        raise RuntimeError(f"Database already has {existing} students, pass overwrite=True to replace them")
+
+    counts = {}
+    with conn:
+        students = _read_data_file(students_file)
+        # The counters are dropped with the students and rebuilt on first use
+        for table in ("students", "applications", "shortlists", "selections", "counters"):
+            conn.execute(f"DELETE FROM {table}")
+        seen = set()
+        for s in students:
+            student_id = s.get("student_id") or s.get("id")
+            if not student_id or student_id in seen:
+                print(f"Skipping student with missing/duplicate ID: {s.get('name')}")
+                continue
+            seen.add(student_id)
+            _insert_student(conn, s)
+        counts["students"] = len(seen)
+
+        companies = _read_data_file(companies_file)
+        conn.execute("DELETE FROM companies")
+        conn.executemany(
+            "INSERT INTO companies (job_id, name, role, data) VALUES (?, ?, ?, ?)",
+            [(c.get("job_id"), c.get("name"), c.get("role"), json.dumps(c)) for c in companies],
+        )
+        counts["companies"] = len(companies)
+
+        for table, path in (("notifications", notifications_file), ("queries", queries_file),
+                            ("responses", responses_file)):
+            records = _read_log_file(path)
+            key = LOG_TABLES[table]
+            conn.execute(f"DELETE FROM {table}")
+            conn.executemany(f"INSERT INTO {table} ({key}, data) VALUES (?, ?)",
+                             [(r.get(key), json.dumps(r)) for r in records])
+            counts[table] = len(records)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite storage for the placement portal")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="One-shot import of the JSON data files")
+    migrate.add_argument("--db", default=DB_FILE)
+    migrate.add_argument("--overwrite", action="store_true", help="Replace data already in the database")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        result = migrate_from_json(db_path=args.db, overwrite=args.overwrite)
+        for table, count in result.items():
+            print(f"{table}: {count}")
+        print(f"Done. Set PLACEMENT_STORAGE=sqlite to use {args.db}")
@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+
+import data_utils
+from records import Student, to_students
+
+# Append-only log of student mutations, replayed on top of the students.json snapshot
+SNAPSHOT_FILE = "students.json"
+LOG_FILE = "students.log"
+COMPACT_THRESHOLD = int(os.getenv("STUDENTS_LOG_MAX_BYTES", str(1024 * 1024)))
+
+_lock = threading.RLock()
+# Replayed state: snapshot signature, how far into the log we have read, and the result.
+# version goes up whenever the replay picks up a new snapshot or another
+# process's entries; this process's own appends leave it alone (see version())
+_state = {"snapshot": None, "offset": 0, "students": None, "by_id": None, "by_email": None, "version": 0}
+_compacting = threading.Event()
+
+
+def student_key(student):
+    return student.get("student_id") or student.get("id")
+
+
+# --------- Replay ---------
+# Every entry is idempotent, so replaying a log that was already folded into
+# the snapshot (crash between snapshot write and log truncate) is harmless
+def apply_entry(students, by_id, by_email, entry):
+    op = entry["op"]
+    student_id = entry["id"]
+
+    if op == "add":
+        if student_id not in by_id:
+            record = Student.from_dict(entry["record"])
+            students.append(record)
+            by_id[student_id] = record
+            if record.get("email"):
+                by_email.setdefault(record["email"], record)
+        return
+
+    s = by_id.get(student_id)
+    if s is None:
+        return
+    if op == "update":
+        old_email = s.get("email")
+        s.update(entry["fields"])
+        if s.get("email") != old_email:
+            if by_email.get(old_email) is s:
+                del by_email[old_email]
+            if s.get("email"):
+                by_email.setdefault(s["email"], s)
+    elif op == "apply":
+        applications = s.setdefault("applications", [])
+        if entry["company"] not in applications:
+            applications.append(entry["company"])
+    elif op in ("shortlist", "select"):
+        if op == "select":
+            selected = s.setdefault("selected", [])
+            if entry["job_id"] not in selected:
+                selected.append(entry["job_id"])
+        s.setdefault("shortlists", {}).setdefault(entry["job_id"], {})[entry["round"]] = True
+
+
+def _read_snapshot():
+    try:
+        return to_students(data_utils.read_file(SNAPSHOT_FILE))
+    except FileNotFoundError:
+        return []
+
+
+def _build_indexes(students):
+    by_id, by_email = {}, {}
+    for s in students:
+        by_id.setdefault(student_key(s), s)
+        if s.get("email"):
+            by_email.setdefault(s["email"], s)
+    return by_id, by_email
+
+
+def _replay_from(offset, students, by_id, by_email):
+    try:
+        with open(LOG_FILE, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Half-written tail, pick it up on the next read
+                    break
+                offset += len(line)
+                if line.strip():
+                    apply_entry(students, by_id, by_email, json.loads(line))
+    except FileNotFoundError:
+        pass
+    return offset
+
+
+def load_students():
+    with _lock:
+        snapshot, log = data_utils.file_signature(SNAPSHOT_FILE, LOG_FILE)
+        log_size = log[1] if log else 0
+
+        if _state["students"] is None or _state["snapshot"] != snapshot or log_size < _state["offset"]:
+            students = _read_snapshot()
+            by_id, by_email = _build_indexes(students)
+            _state.update(snapshot=snapshot, offset=0, students=students, by_id=by_id, by_email=by_email,
+                          version=_state["version"] + 1)
+
+        if log_size > _state["offset"]:
+            # Only the new tail of the log is parsed
+            offset = _replay_from(_state["offset"], _state["students"], _state["by_id"], _state["by_email"])
+            if offset != _state["offset"]:
+                _state.update(offset=offset, version=_state["version"] + 1)
+        return _state["students"]
+
+
+def version():
+    # Replay keeps adding to the same students list, so callers caching
+    # something built from it compare this instead of the list's identity. An
+    # unchanged version after this process's own append means nothing else
+    # came in, and patching the cached result with the written students is enough
+    with _lock:
+        return _state["version"]
+
+
+def get_student(student_id):
+    with _lock:
+        load_students()
+        return _state["by_id"].get(student_id)
+
+
+def get_student_by_email(email):
+    with _lock:
+        load_students()
+        return _state["by_email"].get(email)
+
+
+# --------- Writes ---------
+def append(op, student_id, **fields):
+    append_many([(op, student_id, fields)])
+
+
+def append_many(entries):
+    # entries: (op, student_id, fields); written together in one append
+    lines = [json.dumps({"op": op, "id": student_id, **fields}, separators=(",", ":"))
+             for op, student_id, fields in entries]
+    with _lock:
+        load_students()
+        with data_utils.file_lock(LOG_FILE), open(LOG_FILE, "ab") as f:
+            current = (_state["offset"] == f.tell()
+                       and _state["snapshot"] == data_utils.file_signature(SNAPSHOT_FILE)[0])
+            f.write("".join(line + "\n" for line in lines).encode())
+            end = f.tell()
+        if current:
+            # Nothing else was appended since the last replay: apply our own
+            # entries without bumping the version
+            for line in lines:
+                apply_entry(_state["students"], _state["by_id"], _state["by_email"], json.loads(line))
+            _state["offset"] = end
+        load_students()
+        size = os.path.getsize(LOG_FILE)
+    if size > COMPACT_THRESHOLD and not _compacting.is_set():
+        _compacting.set()
+        threading.Thread(target=_background_compact, daemon=True).start()
+
+
+def compact():
+    # Folds the log into a fresh snapshot. The log stays locked from the replay
+    # to the truncate, so an entry appended by another process in between can't
+    # be dropped without reaching the snapshot
+    with _lock, data_utils.file_lock(LOG_FILE):
+        students = load_students()
+        # save_data returns once the snapshot is on disk, only then is the log dropped
+        data_utils.save_data(SNAPSHOT_FILE, students, to_students)
+        with open(LOG_FILE, "w"):
+            pass
+        by_id, by_email = _build_indexes(students)
+        _state.update(snapshot=data_utils.file_signature(SNAPSHOT_FILE)[0], offset=0, students=students,
+                      by_id=by_id, by_email=by_email)
+
+
+def _background_compact():
+    try:
+        compact()
+    except Exception as e:
+        print("Error compacting student log:", e)
+    finally:
+        _compacting.clear()
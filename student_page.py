@@ -1,28 +1,20 @@
 import streamlit as st
 import json
 import os
-import hashlib
-import smtplib
-from email.message import EmailMessage
 import base64
 from dotenv import load_dotenv
 import base64
+import outbox
+import repository
+from data_utils import hash_password
 
 
 load_dotenv()
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
+# Both are queued for the outbox worker (see outbox.py); False if that failed
 def send_confirmation_email(to_email, student_name):
-    EMAIL_USER = os.getenv("EMAIL_USER")
-    EMAIL_PASS = os.getenv("EMAIL_PASS")
-
-    msg = EmailMessage()
-    msg['Subject'] = "🎓 Registration Successful - Placement Portal"
-    msg['From'] = EMAIL_USER
-    msg['To'] = to_email
-    msg.set_content(f"""
+    try:
+        outbox.enqueue(to_email, "🎓 Registration Successful - Placement Portal", f"""
 Hi {student_name},
 
 ✅ You have successfully registered on the Placement Cell Management System.
@@ -32,24 +24,14 @@ You can now log in using your credentials and start applying to companies that m
 Best wishes,  
 Placement Team
 """)
-    try:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-            smtp.login(EMAIL_USER, EMAIL_PASS)
-            smtp.send_message(msg)
         return True
-    except Exception as e:
-        st.warning(f"Email not sent: {e}")
+    except OSError as e:
+        st.warning(f"Email not queued: {e}")
         return False
 
 def send_application_email(to_email, student_name, company_name, role):
-    EMAIL_USER = os.getenv("EMAIL_USER")
-    EMAIL_PASS = os.getenv("EMAIL_PASS")
-
-    msg = EmailMessage()
-    msg['Subject'] = f"📩 Application Submitted - {company_name}"
-    msg['From'] = EMAIL_USER
-    msg['To'] = to_email
-    msg.set_content(f"""
+    try:
+        outbox.enqueue(to_email, f"📩 Application Submitted - {company_name}", f"""
 Hi {student_name},
 
 ✅ You have successfully applied to **{company_name}** for the role of **{role}**.
@@ -59,13 +41,9 @@ We wish you the best for the recruitment process!
 Regards,  
 Placement Cell Team
 """)
-    try:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-            smtp.login(EMAIL_USER, EMAIL_PASS)
-            smtp.send_message(msg)
         return True
-    except Exception as e:
-        st.warning(f"Email not sent for application: {e}")
+    except OSError as e:
+        st.warning(f"Email not queued for application: {e}")
         return False
 
 def register_student():
@@ -83,18 +61,13 @@ def register_student():
             st.error("Please fill in all fields")
             return
 
-        file_path = "students.json"
-        students = []
-        if os.path.exists(file_path):
-            with open(file_path, "r") as f:
-                try:
-                    students = json.load(f)
-                except:
-                    students = []
-
-            if any(s.get("student_id") == student_id or s.get("email") == email for s in students):
-                st.error("Student with this ID or Email already exists!")
-                return
+        try:
+            exists = repository.get_student(student_id) or repository.get_student_by_email(email)
+        except json.JSONDecodeError:
+            exists = None
+        if exists:
+            st.error("Student with this ID or Email already exists!")
+            return
 
         pic_path = None
         if profile_pic:
@@ -116,13 +89,13 @@ def register_student():
             "resume": ""
         }
 
-        students.append(student_data)
-        with open(file_path, "w") as f:
-            json.dump(students, f, indent=4)
+        if not repository.add_student(student_data):
+            st.error("Student with this ID or Email already exists!")
+            return
 
         st.success("Registration successful! Please login now.")
         if send_confirmation_email(email, name):
-            st.info("📧 A confirmation email has been sent.")
+            st.info("📧 A confirmation email is on its way.")
 
 def student_login():
     st.subheader("🔐 Student Login")
@@ -131,18 +104,12 @@ def student_login():
 
     if st.button("Login", key="login_btn"):
         try:
-            with open("students.json", "r") as f:
-                students = json.load(f)
-
-            for student in students:
-                if (
-                    student.get("student_id") == student_id and
-                    student.get("password") == hash_password(password)
-                ):
-                    st.session_state["student"] = student
-                    st.success("Login successful!")
-                    st.experimental_rerun()
-                    return
+            student = repository.get_student(student_id)
+            if student and student.get("password") == hash_password(password):
+                st.session_state["student"] = student
+                st.success("Login successful!")
+                st.experimental_rerun()
+                return
             st.error("Invalid Student ID or Password.")
         except FileNotFoundError:
             st.error("No students registered yet.")
@@ -150,35 +117,25 @@ def student_login():
             st.error("Student data corrupted. Please check the JSON file.")
 
 def apply_to_company(student_id, company_name):
-    with open("students.json", "r") as f:
-        students = json.load(f)
-
-    with open("companies.json", "r") as f:
-        companies = json.load(f)
-
-    student = next((s for s in students if s.get("student_id") == student_id), None)
-    company = next((c for c in companies if c.get("name") == company_name), None)
-
-    if student and company:
-        if company_name not in student.get("applications", []):
-            student["applications"].append(company_name)
-
-            with open("students.json", "w") as f:
-                json.dump(students, f, indent=4)
-
-            send_application_email(
-                to_email=student["email"],
-                student_name=student["name"],
-                company_name=company["name"],
-                role=company.get("role", "N/A")
-            )
-
-            return student
+    company = repository.get_company_by_name(company_name)
+    if not company:
+        return None
+
+    # Only returns the student when the application was newly added
+    student = repository.add_application(student_id, company_name)
+    if student:
+        send_application_email(
+            to_email=student["email"],
+            student_name=student["name"],
+            company_name=company["name"],
+            role=company.get("role", "N/A")
+        )
+
+        return student
 
 def get_eligible_company_count(student, return_list=False):
     try:
-        with open("companies.json", "r") as f:
-            companies = json.load(f)
+        companies = repository.load_companies()
 
         student_cgpa = float(student.get("cgpa", 0))
         student_branch = student.get("branch", "").strip().upper()
@@ -222,18 +179,8 @@ def upload_resume(student):
         with open(saved_path, "wb") as f:
             f.write(uploaded_file.getbuffer())
 
-        # Update student resume path in students.json
-        with open("students.json", "r") as f:
-            students = json.load(f)
-
-        for s in students:
-            if s["student_id"] == student["student_id"]:
-                s["resume"] = saved_path
-                student = s
-                break
-
-        with open("students.json", "w") as f:
-            json.dump(students, f, indent=4)
+        # Update student resume path in storage
+        student = repository.update_student(student["student_id"], {"resume": saved_path}) or student
 
         st.session_state["student"] = student
         st.success("✅ Resume uploaded successfully!")
@@ -364,8 +311,7 @@ def student_dashboard(student):
     elif st.session_state.student_view == "applications":
         st.subheader("📁 Your Applications")
         try:
-            with open("companies.json", "r") as f:
-                companies = json.load(f)
+            companies = repository.load_companies()
             applied_companies = [c for c in companies if c.get("name") in student.get("applications", [])]
             for comp in applied_companies:
                 st.markdown(f"✅ **{comp['name']}** - {comp['role']} - ₹{comp['package']} LPA")
@@ -376,31 +322,27 @@ def student_dashboard(student):
         st.subheader("✏️ Edit Profile")
         updated_name = st.text_input("Name", value=student.get("name", ""))
         updated_email = st.text_input("Email", value=student.get("email", ""))
-        updated_cgpa = st.text_input("CGPA", value=student.get("cgpa", ""))
+        updated_cgpa = st.text_input("CGPA", value=str(student.get("cgpa", "")))
         updated_branch = st.selectbox("Branch", ["CSE", "ECE", "EEE", "MECH", "CIVIL"],
                                       index=["CSE", "ECE", "EEE", "MECH", "CIVIL"].index(student.get("branch", "CSE")))
         uploaded_file = st.file_uploader("📸 Upload New Profile Picture", type=["png", "jpg", "jpeg"])
 
         if st.button("💾 Save Changes"):
-            with open("students.json", "r") as f:
-                students = json.load(f)
-
-            for s in students:
-                if s.get("student_id") == student["student_id"]:
-                    s["name"] = updated_name
-                    s["email"] = updated_email
-                    s["cgpa"] = updated_cgpa
-                    s["branch"] = updated_branch
-                    if uploaded_file:
-                        pic_path = f"profile_pics/{student['student_id']}.png"
-                        with open(pic_path, "wb") as f_img:
-                            f_img.write(uploaded_file.read())
-                        s["profile_pic"] = pic_path
-                    st.session_state["student"] = s
-                    break
-
-            with open("students.json", "w") as f:
-                json.dump(students, f, indent=4)
+            fields = {
+                "name": updated_name,
+                "email": updated_email,
+                "cgpa": updated_cgpa,
+                "branch": updated_branch
+            }
+            if uploaded_file:
+                pic_path = f"profile_pics/{student['student_id']}.png"
+                with open(pic_path, "wb") as f_img:
+                    f_img.write(uploaded_file.read())
+                fields["profile_pic"] = pic_path
+
+            updated = repository.update_student(student["student_id"], fields)
+            if updated:
+                st.session_state["student"] = updated
 
             st.success("Profile updated successfully!")
             st.experimental_rerun()
@@ -442,23 +384,26 @@ def student_dashboard(student):
             else:
                 st.warning("⚠️ Please fill out both the subject and message.")
 
-NOTIFICATIONS_FILE = 'notifications.json'
+# Newest entries shown first; "Show older" pages further back
+PAGE_SIZE = 20
 
-def load_notifications():
-    if os.path.exists(NOTIFICATIONS_FILE):
-        with open(NOTIFICATIONS_FILE, 'r') as file:
-            return json.load(file)
-    return []
+def show_more_button(key):
+    limit = st.session_state.get(key, PAGE_SIZE)
+    if st.button("Show older", key=f"{key}_more"):
+        st.session_state[key] = limit + PAGE_SIZE
+        st.experimental_rerun()
 
 def show_notifications():
     st.subheader("📢 Notifications")
-    notifications = load_notifications()
+    limit = st.session_state.get("notifications_limit", PAGE_SIZE)
+    # One extra row tells us whether there is anything older
+    notifications = [n for _, n in repository.latest("notifications", limit + 1)]
 
     if not notifications:
         st.info("No notifications available.")
         return
 
-    for notif in notifications:
+    for notif in notifications[:limit]:
         with st.container():
             st.markdown(
                 f"""
@@ -473,32 +418,15 @@ def show_notifications():
                 """,
                 unsafe_allow_html=True
             )
+
+    if len(notifications) > limit:
+        show_more_button("notifications_limit")
 import os
 import json
 from datetime import datetime
 
-QUERIES_FILE = "queries.json"
-RESPONSES_FILE = "responses.json"
-
 # --------- Helper Functions ---------
-def load_queries():
-    if not os.path.exists(QUERIES_FILE):
-        return []
-    with open(QUERIES_FILE, "r") as f:
-        return json.load(f)
-
-def save_queries(queries):
-    with open(QUERIES_FILE, "w") as f:
-        json.dump(queries, f, indent=4)
-
-def load_responses():
-    if not os.path.exists(RESPONSES_FILE):
-        return []
-    with open(RESPONSES_FILE, "r") as f:
-        return json.load(f)
-
 def submit_query(student_name, student_id, subject, message):
-    queries = load_queries()
     query = {
         "student_name": student_name,
         "student_id": student_id,
@@ -506,8 +434,7 @@ def submit_query(student_name, student_id, subject, message):
         "message": message,
         "timestamp": str(datetime.now())
     }
-    queries.append(query)
-    save_queries(queries)
+    repository.add_query(query)
 
 # --------- Student UI ---------
 def student_query_section(student_name, student_id):
@@ -525,15 +452,7 @@ def student_query_section(student_name, student_id):
                 "message": message,
                 "date": str(datetime.now())
             }
-            queries = []
-            if os.path.exists("queries.json"):
-                with open("queries.json", "r") as f:
-                    queries = json.load(f)
-
-            queries.append(query)
-
-            with open("queries.json", "w") as f:
-                json.dump(queries, f, indent=4)
+            repository.add_query(query)
 
             st.success("✅ Your query has been submitted!")
         else:
@@ -549,52 +468,26 @@ import json
 def view_admin_responses(student_id):
     st.subheader("📥 Responses from Admin")
 
-    file_path = "responses.json"  
-
-    if not os.path.exists(file_path):
-        st.info("No response file found.")
-        return
-
     try:
-        with open(file_path, "r") as f:
-            responses = json.load(f)
+        # Filter for this student's responses
+        limit = st.session_state.get("responses_limit", PAGE_SIZE)
+        student_responses = repository.load_responses_for(student_id, limit + 1)
     except json.JSONDecodeError:
         st.error("Error reading the responses file.")
         return
 
-    # Filter for this student's responses
-    student_responses = [r for r in responses if r.get("student_id") == student_id]
-
     if student_responses:
-        for r in student_responses:
+        for r in student_responses[:limit]:
             with st.expander(f"📨 Query: {r.get('original_query', 'No query')}"):
                 st.markdown(f"**Response:** {r.get('response', 'No response provided')}")
                 st.markdown(f"📅 **Responded on:** {r.get('response_date', 'No date')}")
+        if len(student_responses) > limit:
+            show_more_button("responses_limit")
     else:
         st.info("No responses from admin yet.")
 import streamlit as st
 import os
 import json
-import hashlib
-
-# File path for storing student data
-STUDENTS_FILE = "students.json"  # Make sure this path matches your project structure
-
-# Helper: Load JSON data
-def load_json(file_path):
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            return json.load(f)
-    return []
-
-# Helper: Save JSON data
-def save_json(file_path, data):
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=4)
-
-# Helper: Hash password securely
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
 
 # Main Forgot Password Function
 def forgot_password():
@@ -613,15 +506,11 @@ def forgot_password():
             st.error("❌ Passwords do not match.")
             return
 
-        students = load_json(STUDENTS_FILE)
-        for student in students:
-            if student["student_id"] == student_id:
-                student["password"] = hash_password(new_password)
-                save_json(STUDENTS_FILE, students)
-                st.success("✅ Password reset successfully! You can now log in.")
-                st.session_state.student_view = "login"
-                st.experimental_rerun()
-                return
+        if repository.update_student(student_id, {"password": hash_password(new_password)}):
+            st.success("✅ Password reset successfully! You can now log in.")
+            st.session_state.student_view = "login"
+            st.experimental_rerun()
+            return
 
         st.error("❌ Student ID not found.")
 
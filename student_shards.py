@@ -0,0 +1,164 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import data_utils
+from records import Student, to_students
+
+# One small file per student under STUDENTS_DIR, so changing a student rewrites
+# only that file. The manifest (student_id -> email, in registration order) is
+# what listing and email lookups use; it is only rewritten when a student is
+# added or changes email.
+LEGACY_FILE = "students.json"
+STUDENTS_DIR = os.getenv("STUDENTS_DIR", "students")
+MANIFEST_FILE = STUDENTS_DIR + ".manifest.json"
+READ_WORKERS = int(os.getenv("STUDENTS_READ_WORKERS", "8"))
+
+_lock = threading.RLock()
+# manifest: signature of the manifest file, ids: its contents, by_email: reverse of ids,
+# files: student_id -> (file signature, Student), students: the list handed out
+_state = {"manifest": None, "ids": {}, "by_email": None, "files": {}, "students": None}
+
+
+def student_file(student_id):
+    return os.path.join(STUDENTS_DIR, quote(str(student_id), safe="") + ".json")
+
+
+def _read_student(student_id):
+    try:
+        return Student.from_dict(data_utils.read_file(student_file(student_id)))
+    except FileNotFoundError:
+        return None
+
+
+def _read_manifest():
+    try:
+        return data_utils.read_file(MANIFEST_FILE)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_all(students):
+    os.makedirs(STUDENTS_DIR, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as pool:
+        list(pool.map(lambda s: data_utils.atomic_write(student_file(s["student_id"]), s), students))
+
+
+def _ensure_layout():
+    # First use: split students.json into per-student files, manifest last so
+    # an interrupted split is simply redone
+    if os.path.exists(MANIFEST_FILE) or not os.path.exists(LEGACY_FILE):
+        return
+    with data_utils.file_lock(MANIFEST_FILE):
+        if os.path.exists(MANIFEST_FILE):
+            return
+        students = to_students(data_utils.read_file(LEGACY_FILE))
+        _write_all(students)
+        data_utils.atomic_write(MANIFEST_FILE, {s["student_id"]: s.get("email") for s in students})
+
+
+def _scan():
+    # One directory listing gives every file's signature
+    signatures = {}
+    try:
+        with os.scandir(STUDENTS_DIR) as entries:
+            for entry in entries:
+                stat = entry.stat()
+                signatures[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        pass
+    return signatures
+
+
+def _refresh_manifest():
+    signature = data_utils.file_signature(MANIFEST_FILE)[0]
+    if signature != _state["manifest"]:
+        _state.update(manifest=signature, ids=_read_manifest(), by_email=None, students=None)
+
+
+# --------- Reads ---------
+def load_students():
+    # Same list object until something changes; only changed files are read, in parallel
+    with _lock:
+        _ensure_layout()
+        _refresh_manifest()
+        signatures = _scan()
+        files = _state["files"]
+
+        def signature(student_id):
+            return signatures.get(os.path.basename(student_file(student_id)))
+
+        stale = [sid for sid in _state["ids"] if sid not in files or files[sid][0] != signature(sid)]
+        if stale:
+            with ThreadPoolExecutor(max_workers=READ_WORKERS) as pool:
+                for sid, student in zip(stale, pool.map(_read_student, stale)):
+                    files[sid] = (signature(sid), student)
+            _state["students"] = None
+
+        if _state["students"] is None:
+            _state["students"] = [files[sid][1] for sid in _state["ids"]
+                                  if sid in files and files[sid][1] is not None]
+        return _state["students"]
+
+
+def get_student(student_id):
+    # Checks just this student's file
+    with _lock:
+        _ensure_layout()
+        _refresh_manifest()
+        if student_id not in _state["ids"]:
+            return None
+        signature = data_utils.file_signature(student_file(student_id))[0]
+        entry = _state["files"].get(student_id)
+        if entry is None or entry[0] != signature:
+            entry = (signature, _read_student(student_id))
+            _state["files"][student_id] = entry
+            _state["students"] = None
+        return entry[1]
+
+
+def get_student_by_email(email):
+    with _lock:
+        _ensure_layout()
+        _refresh_manifest()
+        if _state["by_email"] is None:
+            by_email = {}
+            for sid, student_email in _state["ids"].items():
+                if student_email:
+                    by_email.setdefault(student_email, sid)
+            _state["by_email"] = by_email
+        student_id = _state["by_email"].get(email)
+        return get_student(student_id) if student_id is not None else None
+
+
+# --------- Writes ---------
+def _update_manifest(student_id, email):
+    with data_utils.file_lock(MANIFEST_FILE):
+        ids = _read_manifest()
+        if ids != _state["ids"]:
+            # Another process changed it too, rebuild the list on the next load
+            _state["students"] = None
+        ids[student_id] = email
+        data_utils.atomic_write(MANIFEST_FILE, ids)
+    _state.update(manifest=data_utils.file_signature(MANIFEST_FILE)[0], ids=ids, by_email=None)
+
+
+def save_student(student):
+    # Rewrites only this student's file (and the manifest if the email changed)
+    with _lock:
+        student_id = student["student_id"]
+        path = student_file(student_id)
+        data_utils.atomic_write(path, student)
+        _state["files"][student_id] = (data_utils.file_signature(path)[0], student)
+        if _state["ids"].get(student_id) != student.get("email"):
+            _update_manifest(student_id, student.get("email"))
+
+
+def add_student(student):
+    with _lock:
+        load_students()
+        os.makedirs(STUDENTS_DIR, exist_ok=True)
+        save_student(student)
+        if _state["students"] is not None:
+            _state["students"].append(student)